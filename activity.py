@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta, timezone
+
+from categories import get_registry
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+MICROSECOND = timedelta(microseconds=1)
+
+# Одинаковые смещения разделяют один объект int
+_offsets = {}
+
+
+def local_now():
+    """Текущее время со смещением системного часового пояса."""
+    return datetime.now().astimezone()
+
+
+def to_epoch_us(moment):
+    """datetime -> микросекунды UTC от 1970-01-01; время без смещения считается местным."""
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return (moment - EPOCH) // MICROSECOND
+
+
+def from_epoch_us(value, offset=None):
+    """Микросекунды UTC -> datetime со смещением offset (секунды) или системного пояса."""
+    moment = EPOCH + timedelta(microseconds=value)
+    if offset is None:
+        return moment.astimezone()
+    return moment.astimezone(timezone(timedelta(seconds=offset)))
+
+
+def utc_offset(moment):
+    """Смещение от UTC в секундах; время без смещения считается местным."""
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    offset = int(moment.utcoffset().total_seconds())
+    return _offsets.setdefault(offset, offset)
+
+
+def intern_category(name):
+    """Целочисленный id категории из реестра; старые локализованные имена дают id своей категории."""
+    return get_registry().intern(name)
+
+
+class Activity:
+    """Одна активность с уже разобранным временем.
+
+    start/end - микросекунды UTC от эпохи (end=None, если активность не
+    завершена), start_offset/end_offset - смещение от UTC в секундах в
+    эти моменты, category - id из таблицы категорий. Словарь записи
+    хранилища получается через to_record().
+    """
+
+    __slots__ = ("category", "start", "end", "note", "start_offset", "end_offset")
+
+    def __init__(self, category, start, end=None, note="", start_offset=0, end_offset=0):
+        self.category = category
+        self.start = start
+        self.end = end
+        self.note = note
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+
+    @classmethod
+    def from_times(cls, name, start_time, end_time=None, note=""):
+        """Activity из datetime (со смещением или местного времени)."""
+        return cls(
+            intern_category(name),
+            to_epoch_us(start_time),
+            to_epoch_us(end_time) if end_time is not None else None,
+            note,
+            utc_offset(start_time),
+            utc_offset(end_time) if end_time is not None else 0
+        )
+
+    @classmethod
+    def from_record(cls, record):
+        """Разбирает запись хранилища; ValueError, если время не в ISO-формате.
+
+        Время без смещения (записи до миграции) считается местным.
+        """
+        start = record.get("start")
+        end = record.get("end")
+        start_time = datetime.fromisoformat(start) if start else None
+        end_time = datetime.fromisoformat(end) if end else None
+        return cls(
+            intern_category(record["name"]),
+            to_epoch_us(start_time) if start_time else None,
+            to_epoch_us(end_time) if end_time else None,
+            record.get("note") or "",
+            utc_offset(start_time) if start_time else 0,
+            utc_offset(end_time) if end_time else 0
+        )
+
+    @property
+    def name(self):
+        return get_registry().name_of(self.category)
+
+    @property
+    def start_time(self):
+        return from_epoch_us(self.start, self.start_offset) if self.start is not None else None
+
+    @property
+    def end_time(self):
+        return from_epoch_us(self.end, self.end_offset) if self.end is not None else None
+
+    @property
+    def duration(self):
+        if self.start is None or self.end is None:
+            return None
+        return timedelta(microseconds=self.end - self.start)
+
+    def to_record(self):
+        """Словарь в формате хранилища (name, start, end, duration, note)."""
+        duration = self.duration
+        return {
+            "name": self.name,
+            "start": self.start_time.isoformat() if self.start is not None else None,
+            "end": self.end_time.isoformat() if self.end is not None else None,
+            "duration": str(duration) if duration is not None else None,
+            "note": self.note
+        }
+
+    def __repr__(self):
+        return f"Activity({self.name!r}, {self.start_time}, {self.end_time}, {self.note!r})"
+
+
+def iter_activities(records):
+    """Записи хранилища -> Activity по одной; записи с испорченным временем пропускаются."""
+    for record in records:
+        try:
+            yield Activity.from_record(record)
+        except (TypeError, ValueError):
+            print(f"Ошибка формата времени в активности: {record.get('name')} {record.get('start')} {record.get('end')}")
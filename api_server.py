@@ -0,0 +1,247 @@
+"""Локальный HTTP/JSON API для дашбордов: активности и часы по категориям.
+
+Пример:
+    python api_server.py --path activities.db --port 8765
+    curl "http://127.0.0.1:8765/totals?start=2024-11-01&end=2024-11-30"
+    curl "http://127.0.0.1:8765/aggregate?start=2024-01-01&end=2024-12-31&bucket=month"
+    curl "http://127.0.0.1:8765/activities?start=2024-11-18&end=2024-11-24&name=study"
+
+Даты - YYYY-MM-DD, end включительно; по умолчанию - текущая неделя.
+"""
+import argparse
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from categories import get_registry
+from stats_engine import BUCKETS, aggregate
+from storage import DEFAULT_STORE_PATH, open_storage, store_files
+
+DEFAULT_PORT = 8765
+
+# Сколько последних ответов держать в памяти
+CACHE_SIZE = 128
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def store_signature(path):
+    """(mtime, inode, размер) файлов хранилища (см. store_files); меняется при каждой записи.
+
+    Пустой файл не отличается от отсутствующего: пустой -wal появляется
+    и исчезает при каждом открытии и закрытии базы, данные при этом те же.
+    """
+    signature = []
+    for file_path in store_files(path):
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            signature.append(None)
+            continue
+        signature.append((stat.st_mtime_ns, stat.st_ino, stat.st_size) if stat.st_size else None)
+    return tuple(signature)
+
+
+class QueryCache:
+    """LRU-кэш готовых ответов, сбрасывается целиком при изменении хранилища."""
+
+    def __init__(self, path, size=CACHE_SIZE):
+        self.path = path
+        self.size = size
+        self.entries = OrderedDict()
+        self.signature = store_signature(path)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        signature = store_signature(self.path)
+        if signature != self.signature:
+            self.entries.clear()
+            self.signature = signature
+        body = self.entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key, signature, body):
+        # Ответ, посчитанный по уже изменившемуся хранилищу, не кэшируется
+        if signature != self.signature:
+            return
+        self.entries[key] = body
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_range(params):
+    """start/end из параметров запроса; по умолчанию текущая неделя."""
+    today = date.today()
+    try:
+        start = date.fromisoformat(params.get("start", (today - timedelta(days=today.weekday())).isoformat()))
+        end = date.fromisoformat(params.get("end", (start + timedelta(days=6)).isoformat()))
+    except ValueError as e:
+        raise ApiError(400, f"Bad date: {e}")
+    if end < start:
+        raise ApiError(400, "end must not be before start")
+    return start, end
+
+
+def query_activities(path, params):
+    start, end = parse_range(params)
+    storage = open_storage(path)
+    try:
+        activities = storage.query_range(start, end, params.get("name"))
+    finally:
+        storage.close()
+    return {"start": start.isoformat(), "end": end.isoformat(), "count": len(activities), "activities": activities}
+
+
+def query_totals(path, params):
+    start, end = parse_range(params)
+    storage = open_storage(path)
+    try:
+        daily_totals = storage.daily_totals(start, end)
+    finally:
+        storage.close()
+    registry = get_registry()
+    totals = {}
+    for (_, name), hours in daily_totals.items():
+        key = registry.key_of(name)
+        totals[key] = totals.get(key, 0) + hours
+    return {"start": start.isoformat(), "end": end.isoformat(), "totals": totals}
+
+
+def query_aggregate(path, params):
+    start, end = parse_range(params)
+    bucket = params.get("bucket", "day")
+    if bucket not in BUCKETS:
+        raise ApiError(400, f"bucket must be one of {', '.join(BUCKETS)}")
+    category_keys = params["categories"].split(",") if params.get("categories") else get_registry().keys()
+    edges, totals = aggregate(path, category_keys, start, end + timedelta(days=1), bucket)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket": bucket,
+        "edges": [str(edge) for edge in edges.astype('datetime64[s]')],
+        "totals": {key: totals[code].tolist() for code, key in enumerate(category_keys)},
+    }
+
+
+ENDPOINTS = {
+    "/activities": query_activities,
+    "/totals": query_totals,
+    "/aggregate": query_aggregate,
+}
+
+
+class ApiServer:
+    """asyncio-сервер: запросы считаются в пуле потоков, ответы кэшируются."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, cache_size=CACHE_SIZE):
+        self.path = path
+        self.cache = QueryCache(path, cache_size)
+
+    async def respond(self, method, target):
+        """(статус, тело) для одного запроса."""
+        if method != "GET":
+            return 405, {"error": "Only GET is supported"}
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok", "cache": {"hits": self.cache.hits, "misses": self.cache.misses}}
+        handler = ENDPOINTS.get(url.path)
+        if handler is None:
+            return 404, {"error": f"Unknown endpoint {url.path}", "endpoints": sorted(ENDPOINTS)}
+
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        key = (url.path, tuple(sorted(params.items())))
+        body = self.cache.get(key)
+        if body is not None:
+            return 200, body
+
+        signature = self.cache.signature
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, handler, self.path, params)
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": str(e)}
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        self.cache.put(key, signature, body)
+        return 200, body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    status, body = 400, {"error": "Bad request line"}
+                    keep_alive = False
+                else:
+                    method, target, version = parts
+                    status, body = await self.respond(method, target)
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+                if not isinstance(body, bytes):
+                    body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                    "Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Access-Control-Allow-Origin: *\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving {self.path} on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve activity ranges and aggregates over HTTP/JSON.")
+    parser.add_argument("--path", default=DEFAULT_STORE_PATH, help="activity store (.db, .jsonl or a partition directory)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="number of cached responses")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(ApiServer(args.path, args.cache_size).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
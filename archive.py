@@ -0,0 +1,254 @@
+"""Компактный двоичный столбцовый архив истории активностей.
+
+Пример:
+    python archive.py pack activities.db history.tta
+    python archive.py unpack history.tta restored.json
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+from datetime import timedelta
+
+import numpy as np
+
+from categories import get_registry
+from columnar import ActivityColumns
+from storage import open_storage, batched
+from timezones import MICROSECONDS, format_offset, local_times_with_offsets
+
+MAGIC = b"TTARCH01"
+VERSION = 2
+
+# magic, версия, число записей, число категорий, число заметок,
+# затем смещения секций: starts, ends, start_offsets, end_offsets,
+# codes, note_ids, note_offsets, note_data, categories
+HEADER = struct.Struct("<8sIQII9Q")
+
+# Версия 1 - без смещений от UTC (время только по местным часам)
+HEADER_V1 = struct.Struct("<8sIQII7Q")
+
+PREFIX = struct.Struct("<8sI")
+
+
+def _align(offset, alignment=8):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _to_epoch_us(starts, ends):
+    # None -> NaT (пустой start/end), ISO-строки -> микросекунды по местному времени начала
+    # и смещения от UTC в минутах
+    start_array, end_array, start_offsets, end_offsets = local_times_with_offsets(starts, ends)
+    return (
+        start_array.astype(np.int64), end_array.astype(np.int64),
+        (start_offsets // (60 * MICROSECONDS)).astype(np.int16), (end_offsets // (60 * MICROSECONDS)).astype(np.int16)
+    )
+
+
+def pack(activities, output_path):
+    """Записывает активности в архив, отсортировав по времени начала. Возвращает число записей."""
+    names, starts, ends, notes = [], [], [], []
+    for activity in activities:
+        names.append(activity["name"])
+        starts.append(activity.get("start"))
+        ends.append(activity.get("end"))
+        notes.append(activity.get("note") or "")
+
+    start_array, end_array, start_offsets, end_offsets = _to_epoch_us(starts, ends)
+
+    categories = list(dict.fromkeys(names))
+    if len(categories) > 256:
+        raise ValueError("Archive supports at most 256 categories")
+    category_code = {name: code for code, name in enumerate(categories)}
+    codes = np.fromiter((category_code[name] for name in names), dtype=np.uint8, count=len(names))
+
+    # Таблица строк: каждая уникальная заметка хранится один раз
+    note_table = list(dict.fromkeys(notes))
+    note_id = {note: index for index, note in enumerate(note_table)}
+    note_ids = np.fromiter((note_id[note] for note in notes), dtype=np.uint32, count=len(notes))
+    encoded_notes = [note.encode('utf-8') for note in note_table]
+    note_offsets = np.zeros(len(encoded_notes) + 1, dtype=np.uint64)
+    np.cumsum([len(note) for note in encoded_notes], out=note_offsets[1:])
+
+    # Порядок по времени начала позволяет искать период через searchsorted
+    # (по datetime64, а не int64, чтобы NaT оказались в конце)
+    order = np.argsort(start_array.view('datetime64[us]'), kind='stable')
+    sections = [
+        start_array[order].tobytes(),
+        end_array[order].tobytes(),
+        start_offsets[order].tobytes(),
+        end_offsets[order].tobytes(),
+        codes[order].tobytes(),
+        note_ids[order].tobytes(),
+        note_offsets.tobytes(),
+        b"".join(encoded_notes),
+        json.dumps(categories, ensure_ascii=False).encode('utf-8'),
+    ]
+
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        position = _align(position)
+        offsets.append(position)
+        position += len(section)
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(names), len(categories), len(note_table), *offsets))
+        for offset, section in zip(offsets, sections):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(section)
+    os.replace(tmp_path, output_path)
+    return len(names)
+
+
+class Archive:
+    """Архив, отображённый в память: столбцы - это np.frombuffer без копирования."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+
+        if len(self.buffer) < HEADER_V1.size:
+            raise ValueError(f"{path} is not an activity archive")
+        magic, version = PREFIX.unpack_from(self.buffer)
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError(f"{path} is not an activity archive (version 1 or {VERSION})")
+
+        if version == 1:
+            _, _, count, category_count, note_count, *offsets = HEADER_V1.unpack_from(self.buffer)
+            starts_at, ends_at, codes_at, note_ids_at, note_offsets_at, note_data_at, categories_at = offsets
+            # Смещения неизвестны - записи отдаются по местным часам, без смещения
+            self.start_offsets = self.end_offsets = None
+        else:
+            _, _, count, category_count, note_count, *offsets = HEADER.unpack_from(self.buffer)
+            starts_at, ends_at, start_offsets_at, end_offsets_at, codes_at, note_ids_at, note_offsets_at, \
+                note_data_at, categories_at = offsets
+            self.start_offsets = np.frombuffer(self.buffer, np.int16, count, start_offsets_at)
+            self.end_offsets = np.frombuffer(self.buffer, np.int16, count, end_offsets_at)
+        self.count = count
+        self.starts = np.frombuffer(self.buffer, np.int64, count, starts_at).view('datetime64[us]')
+        self.ends = np.frombuffer(self.buffer, np.int64, count, ends_at).view('datetime64[us]')
+        self.codes = np.frombuffer(self.buffer, np.uint8, count, codes_at)
+        self.note_ids = np.frombuffer(self.buffer, np.uint32, count, note_ids_at)
+        self.note_offsets = np.frombuffer(self.buffer, np.uint64, note_count + 1, note_offsets_at)
+        self.note_data_at = note_data_at
+        self.categories = json.loads(bytes(self.buffer[categories_at:]).decode('utf-8'))
+
+    def __len__(self):
+        return self.count
+
+    def note(self, note_id):
+        """Текст заметки по её номеру в таблице строк."""
+        low = self.note_data_at + int(self.note_offsets[note_id])
+        high = self.note_data_at + int(self.note_offsets[note_id + 1])
+        return bytes(self.buffer[low:high]).decode('utf-8')
+
+    def range_slice(self, start=None, end=None):
+        """Срез записей, начавшихся в [start, end) (datetime или date)."""
+        low = 0 if start is None else np.searchsorted(self.starts, np.datetime64(start, 'us'), side='left')
+        # Записи без start (NaT) лежат в конце и в ограниченный диапазон не попадают
+        high = self.count if end is None else np.searchsorted(self.starts, np.datetime64(end, 'us'), side='left')
+        return slice(low, max(low, high))
+
+    def columns(self, category_keys, start=None, end=None):
+        """ActivityColumns для stats_engine/columnar за период, только с категориями category_keys."""
+        part = self.range_slice(start, end)
+        starts, ends, codes = self.starts[part], self.ends[part], self.codes[part]
+
+        # Перекодируем коды архива в индексы category_keys, лишние категории отбрасываем
+        remap = np.full(256, -1, dtype=np.int64)
+        code_of = get_registry().codes_for(category_keys)
+        for code, name in enumerate(self.categories):
+            if name in code_of:
+                remap[code] = code_of[name]
+        new_codes = remap[codes]
+        keep = (new_codes >= 0) & ~np.isnat(starts) & ~np.isnat(ends)
+        return ActivityColumns(starts[keep], ends[keep], new_codes[keep], category_keys)
+
+    def iter_records(self):
+        """Записи в формате activities.json, время - со смещением, с которым его сохранили."""
+        notes = [self.note(index) for index in range(len(self.note_offsets) - 1)]
+        if self.start_offsets is None:
+            start_offsets = end_offsets = [None] * self.count
+        else:
+            start_offsets, end_offsets = self.start_offsets.tolist(), self.end_offsets.tolist()
+        rows = zip(self.starts.tolist(), self.ends.tolist(), start_offsets, end_offsets, self.codes, self.note_ids)
+        for start, end, start_offset, end_offset, code, note_id in rows:
+            duration = str(end - start) if start and end else None
+            if end and start_offset is not None:
+                # Конец хранится в шкале местного времени начала
+                end += timedelta(minutes=end_offset - start_offset)
+            yield {
+                "name": self.categories[code],
+                "start": _format_time(start, start_offset),
+                "end": _format_time(end, end_offset),
+                "duration": duration,
+                "note": notes[note_id]
+            }
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            # Снимаем ссылки массивов на буфер перед закрытием отображения
+            self.starts = self.ends = self.codes = self.note_ids = self.note_offsets = None
+            self.start_offsets = self.end_offsets = None
+            self.buffer.close()
+
+
+def _format_time(moment, offset_minutes):
+    # Местное время и смещение -> ISO-строка, как в хранилище
+    if not moment:
+        return None
+    if offset_minutes is None:
+        return moment.isoformat()
+    return moment.isoformat() + format_offset(offset_minutes * 60)
+
+
+def unpack(archive_path, output_path):
+    """Переводит архив обратно в activities.json (или .jsonl / .db по расширению)."""
+    archive = Archive(archive_path)
+    try:
+        if output_path.endswith(".json"):
+            count = 0
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write('{\n    "activities": [')
+                for activity in archive.iter_records():
+                    f.write(("\n        " if count == 0 else ",\n        ") + json.dumps(activity, ensure_ascii=False))
+                    count += 1
+                f.write('\n    ]\n}\n')
+        else:
+            storage = open_storage(output_path)
+            for batch in batched(archive.iter_records()):
+                storage.append_many(batch)
+            storage.close()
+            count = len(archive)
+    finally:
+        archive.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert activity history to and from the binary archive format.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack_parser = commands.add_parser("pack", help="store (.db/.jsonl/.json) -> archive")
+    pack_parser.add_argument("source")
+    pack_parser.add_argument("archive")
+    unpack_parser = commands.add_parser("unpack", help="archive -> activities.json/.jsonl/.db")
+    unpack_parser.add_argument("archive")
+    unpack_parser.add_argument("output")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        storage = open_storage(args.source)
+        count = pack(storage.iter_all(), args.archive)
+        storage.close()
+        print(f"Packed {count} activities into {args.archive} ({os.path.getsize(args.archive)} bytes)")
+    else:
+        count = unpack(args.archive, args.output)
+        print(f"Unpacked {count} activities into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
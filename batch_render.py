@@ -0,0 +1,149 @@
+"""Пакетная отрисовка графиков для многих файлов активностей и периодов.
+
+Пример:
+    python batch_render.py alice.db bob.db --last-weeks 4 --last-months 3 -o reports
+    python batch_render.py activities.db --period week:2024-11-18 --period month:2024-11 --period year:2024
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+# Размеры фигур такие же, как у plot_* в скриптах статистики
+FIGURE_SIZES = {"week": (10, 6), "month": (14, 8), "year": (12, 6)}
+
+# Фигуры, переиспользуемые внутри одного процесса-исполнителя
+_figures = {}
+
+
+def parse_period(text):
+    """'week:2024-11-18', 'month:2024-11' или 'year:2024' -> (вид, первый день)."""
+    kind, _, value = text.partition(":")
+    if kind == "week":
+        day = date.fromisoformat(value)
+        return kind, day - timedelta(days=day.weekday())
+    if kind == "month":
+        return kind, datetime.strptime(value, "%Y-%m").date()
+    if kind == "year":
+        return kind, date(int(value), 1, 1)
+    raise ValueError(f"Unknown period: {text}")
+
+
+def last_periods(kind, count, today=None):
+    """Последние count недель или месяцев, включая текущий."""
+    today = today or date.today()
+    periods = []
+    if kind == "week":
+        start = today - timedelta(days=today.weekday())
+        for i in range(count):
+            periods.append((kind, start - timedelta(weeks=i)))
+    else:
+        start = today.replace(day=1)
+        for _ in range(count):
+            periods.append((kind, start))
+            start = (start - timedelta(days=1)).replace(day=1)
+    return periods
+
+
+def period_label(kind, start):
+    if kind == "week":
+        return start.isoformat()
+    if kind == "month":
+        return start.strftime("%Y-%m")
+    return str(start.year)
+
+
+def init_worker():
+    # Только растровый бэкенд, без GUI; задаётся до импорта pyplot в модулях статистики
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def get_figure(kind):
+    """Одна фигура на вид графика в каждом процессе."""
+    if kind not in _figures:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        figure = Figure(figsize=FIGURE_SIZES[kind])
+        FigureCanvasAgg(figure)
+        _figures[kind] = figure
+    return _figures[kind]
+
+
+def render_chart(file_path, kind, start, language, dpi, output_file):
+    """Считывает данные за период и сохраняет один график. Возвращает (файл, секунды)."""
+    started = time.perf_counter()
+    from categories import get_registry
+    category_keys = get_registry().keys()
+    if kind == "week":
+        import weekly_stats
+        time_data = weekly_stats.read_and_process_json(file_path, category_keys, start)
+        draw = weekly_stats.draw_statistics
+    elif kind == "month":
+        import monthly_stats
+        end = (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        time_data = monthly_stats.read_monthly_data(file_path, category_keys, start, end)
+        draw = monthly_stats.draw_monthly_statistics
+    else:
+        import yearly_stats
+        time_data = yearly_stats.read_yearly_data(file_path, category_keys, start.year)
+        draw = yearly_stats.draw_yearly_statistics
+
+    figure = get_figure(kind)
+    draw(figure, time_data, language)
+    figure.savefig(output_file, dpi=dpi, bbox_inches='tight', transparent=True)
+    return output_file, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render weekly/monthly/yearly charts for many activity files.")
+    parser.add_argument("files", nargs="+", help="activity stores (.db, .jsonl or legacy .json)")
+    parser.add_argument("--period", action="append", default=[], type=parse_period,
+                        help="week:YYYY-MM-DD, month:YYYY-MM or year:YYYY (repeatable)")
+    parser.add_argument("--last-weeks", type=int, default=0, help="also render the last N weeks")
+    parser.add_argument("--last-months", type=int, default=0, help="also render the last N months")
+    parser.add_argument("-o", "--output-dir", default="reports")
+    parser.add_argument("--language", choices=["ru", "en"], default="ru")
+    parser.add_argument("--format", choices=["png", "jpg"], default="png")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    periods = args.period + last_periods("week", args.last_weeks) + last_periods("month", args.last_months)
+    if not periods:
+        parser.error("no periods given (use --period, --last-weeks or --last-months)")
+    for file_path in args.files:
+        if not os.path.exists(file_path):
+            parser.error(f"file not found: {file_path}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = []
+    for file_path in args.files:
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        for kind, start in periods:
+            output_file = os.path.join(
+                args.output_dir, f"{stem}_{kind}_{period_label(kind, start)}.{args.format}"
+            )
+            jobs.append((file_path, kind, start, args.language, args.dpi, output_file))
+
+    started = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+        futures = {pool.submit(render_chart, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                output_file, seconds = future.result()
+                print(f"{seconds:8.3f}s  {output_file}")
+            except Exception as e:
+                failed += 1
+                print(f"   error  {futures[future][-1]}: {e}")
+
+    elapsed = time.perf_counter() - started
+    rendered = len(jobs) - failed
+    print(f"Rendered {rendered} charts in {elapsed:.2f}s ({rendered / elapsed:.1f} charts/s, {args.workers} workers)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
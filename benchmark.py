@@ -0,0 +1,313 @@
+"""Бенчмарк хранилища и статистики на синтетических журналах активностей.
+
+Пример:
+    python benchmark.py --sizes 1000 100000 1000000 --output bench_results.json
+    python benchmark.py --sizes 1000 100000 --baseline bench_baseline.json
+    python benchmark.py --sizes 1000 100000 --output bench_baseline.json   # записать новый эталон
+    python benchmark.py --stress-writers 16 --stress-records 200   # проверка параллельных писателей
+    python benchmark.py --startup --categories 4 50 200   # запуск окна и смена языка
+"""
+import argparse
+import gc
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import matplotlib
+matplotlib.use("Agg")
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import monthly_stats
+import weekly_stats
+from stats_engine import aggregate
+import categories
+from categories import DEFAULT_CATEGORY_KEYS, CategoryRegistry
+from storage import SqliteStorage, JsonlStorage, PartitionedStorage, batched, open_storage
+
+# Только встроенные категории, чтобы пользовательские не меняли результаты
+CATEGORY_KEYS = DEFAULT_CATEGORY_KEYS
+
+# Журнал заканчивается в фиксированный день, чтобы прогоны были сравнимы
+END_OF_LOG = datetime(2024, 12, 31, 23, 0)
+WEEK_START = END_OF_LOG.date() - timedelta(days=END_OF_LOG.weekday() + 7)
+MONTH_START = END_OF_LOG.date().replace(day=1)
+
+NOTES = ["", "", "", "lecture", "chapter 3", "gym", "reading", "project work"]
+
+
+def generate_activities(count, seed=42, years=10):
+    """Детерминированный поток записей в формате activities.json, по времени начала.
+
+    Активности равномерно распределены по последним years годам до END_OF_LOG.
+    """
+    rng = random.Random(seed)
+    span = timedelta(days=365 * years).total_seconds()
+    mean_gap = span / count
+    current = END_OF_LOG - timedelta(seconds=span)
+    for _ in range(count):
+        current += timedelta(seconds=rng.expovariate(1 / mean_gap))
+        duration = timedelta(seconds=rng.randint(60, 4 * 3600))
+        # Время со смещением системного пояса, как его пишет приложение
+        start = current.astimezone()
+        yield {
+            "name": rng.choice(CATEGORY_KEYS),
+            "start": start.isoformat(),
+            "end": (start + duration).astimezone().isoformat(),
+            "duration": str(duration),
+            "note": rng.choice(NOTES)
+        }
+
+
+def build_stores(directory, count, seed):
+    """Создаёт SQLite и JSON Lines хранилища с одинаковыми данными."""
+    db_path = os.path.join(directory, f"bench_{count}.db")
+    log_path = os.path.join(directory, f"bench_{count}.jsonl")
+    sqlite_storage = SqliteStorage(db_path, log_path=None, legacy_path=None)
+    jsonl_storage = JsonlStorage(log_path, legacy_path=None)
+    for batch in batched(generate_activities(count, seed)):
+        sqlite_storage.append_many(batch)
+        jsonl_storage.append_many(batch)
+    return sqlite_storage, jsonl_storage
+
+
+def measure(function, repeat):
+    """Лучшее время из repeat запусков и пиковая память Python отдельным запуском."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def benchmark_size(count, seed, repeat, directory, render):
+    sqlite_storage, jsonl_storage = build_stores(directory, count, seed)
+    new_record = next(generate_activities(1, seed + 1))
+    week_end = WEEK_START + timedelta(days=6)
+    month_end = END_OF_LOG.date()
+
+    cases = {
+        "save.sqlite": lambda: sqlite_storage.append(new_record),
+        "save.jsonl": lambda: jsonl_storage.append(new_record),
+        "filter_week.sqlite": lambda: sqlite_storage.query_range(WEEK_START, week_end),
+        "filter_week.jsonl": lambda: jsonl_storage.query_range(WEEK_START, week_end),
+        "weekly_aggregate": lambda: weekly_stats.read_and_process_json(
+            sqlite_storage.path, CATEGORY_KEYS, WEEK_START),
+        "monthly_aggregate": lambda: monthly_stats.read_monthly_data(
+            sqlite_storage.path, CATEGORY_KEYS, MONTH_START, month_end),
+        "hourly_aggregate": lambda: aggregate(
+            sqlite_storage.path, CATEGORY_KEYS, datetime.combine(WEEK_START, datetime.min.time()),
+            datetime.combine(week_end, datetime.min.time()), "hour"),
+    }
+    if render:
+        week_data = weekly_stats.read_and_process_json(sqlite_storage.path, CATEGORY_KEYS, WEEK_START)
+        month_data = monthly_stats.read_monthly_data(sqlite_storage.path, CATEGORY_KEYS, MONTH_START, month_end)
+        week_figure = Figure(figsize=(10, 6))
+        month_figure = Figure(figsize=(14, 8))
+        FigureCanvasAgg(week_figure)
+        FigureCanvasAgg(month_figure)
+
+        def render_week():
+            weekly_stats.draw_statistics(week_figure, week_data)
+            week_figure.savefig(io.BytesIO(), format="png", dpi=100)
+
+        def render_month():
+            monthly_stats.draw_monthly_statistics(month_figure, month_data)
+            month_figure.savefig(io.BytesIO(), format="png", dpi=100)
+
+        cases["render_week"] = render_week
+        cases["render_month"] = render_month
+
+    results = []
+    for name, function in cases.items():
+        seconds, peak = measure(function, repeat)
+        results.append({"name": name, "size": count, "seconds": seconds, "peak_bytes": peak})
+        print(f"{name:24} {count:>10}  {seconds * 1000:10.3f} ms  {peak / 1024:10.1f} KiB")
+
+    sqlite_storage.close()
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    """Замеры, ставшие медленнее эталона больше чем на threshold (доля)."""
+    reference = {(item["name"], item["size"]): item for item in baseline.get("results", [])}
+    regressions = []
+    for item in results:
+        old = reference.get((item["name"], item["size"]))
+        if old and item["seconds"] > old["seconds"] * (1 + threshold):
+            regressions.append((item, old))
+    return regressions
+
+
+def stress_writer(path, worker, count):
+    """Один процесс-писатель: count отдельных сохранений, как от нажатий Stop."""
+    storage = open_storage(path)
+    for i in range(count):
+        now = datetime.now().astimezone()
+        storage.append({
+            "name": CATEGORY_KEYS[i % len(CATEGORY_KEYS)],
+            "start": now.isoformat(),
+            "end": (now + timedelta(minutes=1)).isoformat(),
+            "duration": "0:01:00",
+            "note": f"{worker}:{i}"
+        })
+    storage.close()
+
+
+def stress_writers(directory, processes, count):
+    """Запускает processes писателей на каждое хранилище и проверяет, что ничего не потеряно."""
+    stores = {
+        "jsonl": os.path.join(directory, "stress.jsonl"),
+        "sqlite": os.path.join(directory, "stress.db"),
+        "partitioned": os.path.join(directory, "stress_parts"),
+    }
+    JsonlStorage(stores["jsonl"], legacy_path=None)
+    SqliteStorage(stores["sqlite"], log_path=None, legacy_path=None).close()
+    PartitionedStorage(stores["partitioned"])
+
+    expected = {f"{worker}:{i}" for worker in range(processes) for i in range(count)}
+    failures = 0
+    for backend, path in stores.items():
+        started = time.perf_counter()
+        workers = [
+            multiprocessing.Process(target=stress_writer, args=(path, worker, count))
+            for worker in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+
+        storage = open_storage(path)
+        notes = [activity["note"] for activity in storage.iter_all()]
+        storage.close()
+        lost = len(expected - set(notes))
+        duplicated = len(notes) - len(set(notes))
+        elapsed = time.perf_counter() - started
+        status = "OK" if not lost and not duplicated else "FAILED"
+        failures += status == "FAILED"
+        print(f"{backend:12} {processes} writers x {count}: {len(notes)} records, "
+              f"{lost} lost, {duplicated} duplicated, {elapsed:.2f}s  {status}")
+    return failures
+
+
+def benchmark_startup(category_counts, repeat):
+    """Время создания главного окна и смены языка при разном числе категорий."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    import trackerapp
+
+    app = QApplication.instance() or QApplication([])
+    results = []
+    old_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # Окно открывает хранилище в текущем каталоге
+        os.chdir(directory)
+        try:
+            for count in category_counts:
+                registry = CategoryRegistry()
+                for i in range(len(registry.keys()), count):
+                    registry.add_category(f"category{i}", {"ru": f"Категория {i}", "en": f"Category {i}"})
+                categories._registry = registry
+                windows = []
+
+                def start():
+                    windows.append(trackerapp.TimeTrackerApp())
+
+                def switch():
+                    windows[-1].switch_language()
+
+                for name, function in (("startup", start), ("switch_language", switch)):
+                    seconds, peak = measure(function, repeat)
+                    results.append({"name": name, "size": count, "seconds": seconds, "peak_bytes": peak})
+                    print(f"{name:24} {count:>10}  {seconds * 1000:10.3f} ms  {peak / 1024:10.1f} KiB")
+
+                for window in windows:
+                    window.writer.close()
+                    window.checkpoint.close()
+                    window.storage.close()
+                    window.deleteLater()
+                app.processEvents()
+        finally:
+            categories._registry = None
+            os.chdir(old_directory)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark storage, aggregation and chart rendering.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="activity log sizes to generate (1k .. 10M)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--no-render", action="store_true", help="skip chart rendering")
+    parser.add_argument("--stress-writers", type=int, default=0,
+                        help="instead of benchmarking, run N concurrent writer processes per backend")
+    parser.add_argument("--stress-records", type=int, default=100, help="saves per stress writer")
+    parser.add_argument("--startup", action="store_true",
+                        help="measure main window startup and language switching instead of storage")
+    parser.add_argument("--categories", type=int, nargs="+", default=[4, 50, 200],
+                        help="category counts for --startup")
+    args = parser.parse_args()
+
+    if args.stress_writers:
+        with tempfile.TemporaryDirectory() as directory:
+            return 1 if stress_writers(directory, args.stress_writers, args.stress_records) else 0
+
+    results = []
+    if args.startup:
+        results = benchmark_startup(args.categories, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            for count in args.sizes:
+                results.extend(benchmark_size(count, args.seed, args.repeat, directory, not args.no_render))
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for item, old in regressions:
+            print(f"REGRESSION {item['name']} size={item['size']}: "
+                  f"{old['seconds'] * 1000:.3f} ms -> {item['seconds'] * 1000:.3f} ms")
+        if regressions:
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
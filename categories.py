@@ -0,0 +1,207 @@
+"""Реестр категорий: стабильные id, подписи на языках и старые имена-синонимы.
+
+Пример:
+    python categories.py list
+    python categories.py add sport --label ru=Спорт --label en=Sport
+    python categories.py alias "Учёба" study
+    python categories.py migrate --store activities.db
+"""
+import argparse
+import json
+import os
+
+from storage import DEFAULT_STORE_PATH, open_storage
+
+# Пользовательские категории и синонимы
+CATEGORIES_PATH = "categories.json"
+
+# Встроенные категории; их id никогда не меняются
+DEFAULT_CATEGORIES = [
+    {"id": 0, "key": "study", "labels": {"ru": "Учеба", "en": "Study"}},
+    {"id": 1, "key": "homework", "labels": {"ru": "Дз", "en": "Homework"}},
+    {"id": 2, "key": "relax", "labels": {"ru": "Отдых", "en": "Relax"}},
+    {"id": 3, "key": "other", "labels": {"ru": "Другое", "en": "Other"}},
+]
+
+DEFAULT_CATEGORY_KEYS = [category["key"] for category in DEFAULT_CATEGORIES]
+
+
+class CategoryRegistry:
+    """Категории по id и ключу.
+
+    Подписи категорий на всех языках (например "Учеба" из старых записей)
+    и явные синонимы из categories.json разрешаются в ключ категории.
+    Незнакомые имена получают временный id, который не сохраняется.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.categories = [dict(category) for category in DEFAULT_CATEGORIES]
+        self.extra_aliases = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.categories += data.get("categories", [])
+            self.extra_aliases = data.get("aliases", {})
+        # Временные id для имён вне реестра (только на время работы процесса)
+        self.transient = {}
+        self.transient_names = {}
+        self._build()
+
+    def _build(self):
+        self.ids = {}
+        self.names = {}
+        self.labels = {}
+        for category in self.categories:
+            self.ids[category["key"]] = category["id"]
+            self.names[category["id"]] = category["key"]
+            self.labels[category["key"]] = category["labels"]
+        self.aliases = {}
+        for category in self.categories:
+            for label in category["labels"].values():
+                if label not in self.ids:
+                    self.aliases[label] = category["key"]
+        for alias, key in self.extra_aliases.items():
+            if key in self.ids:
+                self.aliases[alias] = key
+        self.next_id = max(list(self.names) + list(self.transient_names)) + 1
+
+    def keys(self):
+        """Ключи зарегистрированных категорий в порядке id."""
+        return [self.names[category_id] for category_id in sorted(self.names)]
+
+    def key_of(self, name):
+        """Ключ категории для имени или синонима; незнакомое имя возвращается как есть."""
+        return name if name in self.ids else self.aliases.get(name, name)
+
+    def all_names(self, name):
+        """Ключ категории и все её синонимы (старые записи могут хранить любое из них)."""
+        key = self.key_of(name)
+        return [key] + [alias for alias, alias_key in self.aliases.items() if alias_key == key]
+
+    def id_of(self, name):
+        """Стабильный id категории или None для незнакомого имени."""
+        return self.ids.get(self.key_of(name))
+
+    def intern(self, name):
+        """id для любого имени: зарегистрированного, синонима или временного."""
+        category_id = self.id_of(name)
+        if category_id is None:
+            category_id = self.transient.get(name)
+            if category_id is None:
+                category_id = self.transient[name] = self.next_id
+                self.transient_names[category_id] = name
+                self.next_id += 1
+        return category_id
+
+    def name_of(self, category_id):
+        name = self.names.get(category_id)
+        return name if name is not None else self.transient_names[category_id]
+
+    def label(self, key, language):
+        """Подпись категории на языке language (или сам ключ)."""
+        return self.labels.get(key, {}).get(language, key)
+
+    def codes_for(self, category_keys):
+        """{имя: индекс в category_keys} вместе со всеми синонимами этих категорий."""
+        code_of = {key: code for code, key in enumerate(category_keys)}
+        for alias, key in self.aliases.items():
+            if key in code_of and alias not in code_of:
+                code_of[alias] = code_of[key]
+        return code_of
+
+    def add_category(self, key, labels):
+        """Регистрирует новую категорию и сохраняет реестр. Возвращает её id."""
+        if key in self.ids or key in self.aliases:
+            raise ValueError(f"Category {key} already exists")
+        # next_id больше и постоянных, и временных id
+        category_id = self.next_id
+        self.categories.append({"id": category_id, "key": key, "labels": dict(labels)})
+        self._build()
+        self.save()
+        return category_id
+
+    def add_alias(self, alias, key):
+        """Старое имя alias будет считаться категорией key."""
+        if key not in self.ids:
+            raise ValueError(f"Unknown category {key}")
+        self.extra_aliases[alias] = key
+        self._build()
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        data = {
+            "categories": [category for category in self.categories if category["id"] >= len(DEFAULT_CATEGORIES)],
+            "aliases": self.extra_aliases
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+_registry = None
+
+
+def get_registry():
+    """Реестр приложения (categories.json рядом с данными), загружается один раз."""
+    global _registry
+    if _registry is None:
+        _registry = CategoryRegistry(CATEGORIES_PATH)
+    return _registry
+
+
+def normalize_store(path, registry=None):
+    """Переименовывает записи с устаревшими именами категорий в их ключи.
+
+    Возвращает число изменённых записей.
+    """
+    registry = registry or get_registry()
+    storage = open_storage(path)
+    try:
+        return storage.rename_categories(registry.aliases)
+    finally:
+        storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage activity categories.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="show categories and aliases")
+    add_parser = commands.add_parser("add", help="register a new category")
+    add_parser.add_argument("key")
+    add_parser.add_argument("--label", action="append", default=[], metavar="LANG=TEXT",
+                            help="label for a language, e.g. ru=Спорт (repeatable)")
+    alias_parser = commands.add_parser("alias", help="treat an old name as an existing category")
+    alias_parser.add_argument("alias")
+    alias_parser.add_argument("key")
+    migrate_parser = commands.add_parser("migrate", help="rename aliased records in a store to category keys")
+    migrate_parser.add_argument("--store", default=DEFAULT_STORE_PATH)
+    args = parser.parse_args()
+
+    registry = get_registry()
+    try:
+        if args.command == "list":
+            for key in registry.keys():
+                labels = ", ".join(f"{language}={label}" for language, label in registry.labels[key].items())
+                print(f"{registry.id_of(key):4}  {key:12} {labels}")
+            for alias, key in sorted(registry.aliases.items()):
+                print(f"      {alias} -> {key}")
+        elif args.command == "add":
+            labels = dict(label.split("=", 1) for label in args.label)
+            print(f"Added category {args.key} with id {registry.add_category(args.key, labels)}")
+        elif args.command == "alias":
+            registry.add_alias(args.alias, args.key)
+            print(f"{args.alias} -> {args.key}")
+        else:
+            print(f"Renamed {normalize_store(args.store, registry)} activities in {args.store}")
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,27 @@
+from PyQt5.QtWidgets import QMainWindow
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+
+
+class ChartWindow(QMainWindow):
+    """Окно с графиком внутри приложения.
+
+    Фигура и холст создаются один раз, а при каждом открытии графика
+    только перерисовываются.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.resize(1000, 600)
+        self.figure = Figure(figsize=(10, 6))
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.setCentralWidget(self.canvas)
+
+    def show_chart(self, title, draw, time_data, language):
+        """Рисует график функцией draw(fig, time_data, language) и показывает окно."""
+        draw(self.figure, time_data, language)
+        self.canvas.draw_idle()
+        self.setWindowTitle(title)
+        self.show()
+        self.raise_()
+        self.activateWindow()
@@ -0,0 +1,152 @@
+import os
+import struct
+from datetime import datetime, timedelta
+
+from activity import to_epoch_us, from_epoch_us
+from categories import get_registry
+
+MAGIC = b"TTTIMER3"
+
+# Прежние форматы хранили ключ категории строкой в 32 байтах;
+# в TTTIMER1 время ещё и в микросекундах по местным часам, а не UTC
+LOCAL_TIME_MAGIC = b"TTTIMER1"
+KEY_MAGIC = b"TTTIMER2"
+KEY_SLOT = struct.Struct("<32sqq256s")
+
+# magic, время последнего сердцебиения (микросекунды UTC от 1970-01-01)
+HEADER = struct.Struct("<8sq")
+
+# id категории из реестра, начало, конец (0 - таймер ещё идёт), заметка;
+# слот с нулевым началом свободен
+SLOT = struct.Struct("<qqq256s")
+
+# Сколько таймеров может идти одновременно
+MAX_TIMERS = 16
+
+# Как часто обновляется время в заголовке, пока идут таймеры (секунды)
+HEARTBEAT_INTERVAL = 30
+
+# Если приложение перезапущено не позже этого после сердцебиения, таймеры продолжаются;
+# иначе (сбой, сон компьютера) сессии закрываются временем последнего сердцебиения
+RESUME_WINDOW = timedelta(minutes=5)
+
+FILE_SIZE = HEADER.size + SLOT.size * MAX_TIMERS
+
+def checkpoint_path(storage_path):
+    """activities.db -> activities.timers (рядом с хранилищем)."""
+    return os.path.splitext(os.path.normpath(storage_path))[0] + ".timers"
+
+
+class TimerCheckpoint:
+    """Файл состояния идущих таймеров фиксированного размера.
+
+    При старте таймера пишется его слот, сердцебиение перезаписывает только
+    8 байт заголовка, поэтому цена не зависит от размера истории. После сбоя
+    recover() возвращает незавершённые сессии и время последнего сердцебиения.
+    Категория хранится стабильным id из реестра registry, так что длина её
+    ключа не ограничена размером слота.
+    """
+
+    def __init__(self, path, registry=None):
+        self.path = path
+        self.registry = registry or get_registry()
+        if not os.path.exists(path):
+            self._create()
+        self.file = open(path, 'r+b', buffering=0)
+        magic, _ = HEADER.unpack(self.file.read(HEADER.size))
+        if magic in (LOCAL_TIME_MAGIC, KEY_MAGIC):
+            self._upgrade(magic)
+        elif magic != MAGIC:
+            raise ValueError(f"{path} is not a timer state file")
+        elif os.path.getsize(path) != FILE_SIZE:
+            # Обрезанный файл: состояние таймеров потеряно, начинаем с пустого
+            self.file.close()
+            self._create()
+            self.file = open(path, 'r+b', buffering=0)
+
+    def _create(self):
+        with open(self.path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, 0) + b"\0" * (SLOT.size * MAX_TIMERS))
+
+    def _write(self, offset, data):
+        self.file.seek(offset)
+        self.file.write(data)
+        os.fsync(self.file.fileno())
+
+    def _upgrade(self, magic):
+        # Ключи категорий -> id, местное время TTTIMER1 -> UTC; идущие таймеры сохраняются
+        def to_utc(value):
+            if not value or magic != LOCAL_TIME_MAGIC:
+                return value
+            return to_epoch_us(datetime(1970, 1, 1) + timedelta(microseconds=value))
+
+        self.file.seek(0)
+        data = self.file.read(HEADER.size + KEY_SLOT.size * MAX_TIMERS)
+        _, heartbeat = HEADER.unpack_from(data)
+        slots = []
+        for slot in range(MAX_TIMERS):
+            key, start, end, note = KEY_SLOT.unpack_from(data, HEADER.size + slot * KEY_SLOT.size)
+            # Длинный ключ мог быть обрезан посреди символа - такой таймер не восстановить
+            category_id = self.registry.id_of(key.rstrip(b"\0").decode('utf-8', 'ignore'))
+            if category_id is None or not start:
+                slots.append(b"\0" * SLOT.size)
+            else:
+                slots.append(SLOT.pack(category_id, to_utc(start), to_utc(end), note))
+        self.file.truncate(FILE_SIZE)
+        self._write(0, HEADER.pack(MAGIC, to_utc(heartbeat)) + b"".join(slots))
+
+    def _slot_offset(self, slot):
+        return HEADER.size + slot * SLOT.size
+
+    def recover(self):
+        """(последнее сердцебиение или None, [(слот, ключ, начало, конец или None, заметка)])."""
+        self.file.seek(0)
+        data = self.file.read(FILE_SIZE)
+        _, heartbeat = HEADER.unpack_from(data)
+        sessions = []
+        for slot in range(MAX_TIMERS):
+            category_id, start, end, note = SLOT.unpack_from(data, self._slot_offset(slot))
+            if start:
+                try:
+                    key = self.registry.name_of(category_id)
+                except KeyError:
+                    # Категорию удалили из categories.json - таймер не восстановить
+                    continue
+                sessions.append((
+                    slot, key, from_epoch_us(start), from_epoch_us(end) if end else None,
+                    note.rstrip(b"\0").decode('utf-8', 'ignore')
+                ))
+        return (from_epoch_us(heartbeat) if heartbeat else None), sessions
+
+    def start(self, key, start, note):
+        """Записывает идущий таймер в свободный слот и возвращает его номер."""
+        category_id = self.registry.id_of(key)
+        if category_id is None:
+            raise ValueError(f"Unknown category {key}")
+        self.file.seek(0)
+        data = self.file.read(FILE_SIZE)
+        used = {slot for slot in range(MAX_TIMERS) if SLOT.unpack_from(data, self._slot_offset(slot))[1]}
+        slot = next((i for i in range(MAX_TIMERS) if i not in used), None)
+        if slot is None:
+            raise ValueError(f"At most {MAX_TIMERS} timers can run at once")
+        # Длинная заметка обрезается по границе символа
+        note = note.encode('utf-8')[:256].decode('utf-8', 'ignore').encode('utf-8')
+        self._write(self._slot_offset(slot), SLOT.pack(category_id, to_epoch_us(start), 0, note))
+        self.heartbeat(start)
+        return slot
+
+    def stop(self, slot, end):
+        """Отмечает таймер остановленным; слот занят, пока запись не сохранена."""
+        # Поле конца идёт после id категории и начала (по 8 байт)
+        self._write(self._slot_offset(slot) + 16, struct.pack("<q", to_epoch_us(end)))
+
+    def release(self, slot):
+        """Освобождает слот после сохранения записи."""
+        self._write(self._slot_offset(slot), b"\0" * SLOT.size)
+
+    def heartbeat(self, moment=None):
+        # Перезаписывается только время в заголовке, сразу после magic
+        self._write(len(MAGIC), struct.pack("<q", to_epoch_us(moment or datetime.now())))
+
+    def close(self):
+        self.file.close()
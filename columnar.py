@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import numpy as np
+
+from categories import get_registry
+from timezones import local_times
+
+HOUR = np.timedelta64(1, 'h')
+
+
+class ActivityColumns:
+    """Журнал активностей в виде столбцов NumPy.
+
+    starts - массив datetime64[us] по местному времени начала, ends - конец
+    в той же шкале (ends - starts - настоящая длительность), codes - индекс
+    категории в category_keys для каждой активности.
+    """
+
+    def __init__(self, starts, ends, codes, category_keys):
+        self.starts = starts
+        self.ends = ends
+        self.codes = codes
+        self.category_keys = list(category_keys)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def durations_hours(self):
+        """Длительность каждой активности в часах."""
+        return (self.ends - self.starts) / HOUR
+
+
+def load_columns(activities, category_keys):
+    """Переводит записи в столбцы, отбрасывая чужие категории и пустые даты."""
+    # Старые записи с локализованными именами ("Учеба") попадают в свою категорию
+    code_of = get_registry().codes_for(category_keys)
+    names, starts, ends = [], [], []
+    for activity in activities:
+        start = activity.get("start")
+        end = activity.get("end")
+        if activity["name"] in code_of and isinstance(start, str) and isinstance(end, str):
+            names.append(activity["name"])
+            starts.append(start)
+            ends.append(end)
+
+    try:
+        # Разбор ISO-строк целиком на стороне NumPy, смещения - по таблице переходов
+        start_array, end_array = local_times(starts, ends)
+    except ValueError:
+        names, start_array, end_array = _parse_one_by_one(names, starts, ends)
+
+    codes = np.fromiter((code_of[name] for name in names), dtype=np.int64, count=len(names))
+    return ActivityColumns(start_array, end_array, codes, category_keys)
+
+
+def _parse_one_by_one(names, starts, ends):
+    # Медленный путь: в журнале есть строки, которые NumPy не разобрал
+    good_names, good_starts, good_ends = [], [], []
+    for name, start, end in zip(names, starts, ends):
+        try:
+            start_time = datetime.fromisoformat(start)
+            end_time = datetime.fromisoformat(end)
+            if (start_time.tzinfo is None) != (end_time.tzinfo is None):
+                raise ValueError("only one of start and end has a UTC offset")
+        except ValueError:
+            print(f"Ошибка формата времени в активности: {name} {start} {end}")
+            continue
+        # Конец - в шкале местного времени начала
+        wall_start = start_time.replace(tzinfo=None)
+        good_names.append(name)
+        good_starts.append(np.datetime64(wall_start, 'us'))
+        good_ends.append(np.datetime64(wall_start + (end_time - start_time), 'us'))
+    return (
+        good_names,
+        np.array(good_starts, dtype='datetime64[us]'),
+        np.array(good_ends, dtype='datetime64[us]')
+    )
+
+
+def to_time_data(totals, category_keys):
+    """Массив (категории, корзины) -> словарь {категория: [часы, ...]}."""
+    return {key: totals[code].tolist() for code, key in enumerate(category_keys)}
@@ -0,0 +1,197 @@
+import ctypes
+import ctypes.util
+import os
+import time
+from datetime import timedelta
+
+from activity import local_now
+
+# Простой короче этого не считается перерывом
+IDLE_THRESHOLD = timedelta(minutes=5)
+
+# Как часто опрашивается источник, пока идут таймеры (секунды)
+IDLE_SAMPLE_INTERVAL = 5
+
+# Строки /proc/interrupts, относящиеся к клавиатуре и мыши
+INPUT_IRQ_NAMES = (b"i8042", b"keyboard", b"mouse", b"touchpad", b"hid")
+
+
+class _XScreenSaverInfo(ctypes.Structure):
+    _fields_ = [
+        ("window", ctypes.c_ulong),
+        ("state", ctypes.c_int),
+        ("kind", ctypes.c_int),
+        ("til_or_since", ctypes.c_ulong),
+        ("idle", ctypes.c_ulong),
+        ("event_mask", ctypes.c_ulong),
+    ]
+
+
+class X11IdleSource:
+    """Время без ввода из расширения MIT-SCREEN-SAVER (libXss); OSError, если X11 недоступен."""
+
+    def __init__(self, display=None):
+        x11_path = ctypes.util.find_library("X11")
+        xss_path = ctypes.util.find_library("Xss")
+        if not x11_path or not xss_path:
+            raise OSError("libX11/libXss not found")
+        self.x11 = ctypes.CDLL(x11_path)
+        self.xss = ctypes.CDLL(xss_path)
+        self.x11.XOpenDisplay.restype = ctypes.c_void_p
+        self.x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self.x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        self.x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        self.x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self.xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XScreenSaverInfo)]
+
+        self.display = self.x11.XOpenDisplay(display.encode() if display else None)
+        if not self.display:
+            raise OSError("Cannot open X display")
+        self.root = self.x11.XDefaultRootWindow(self.display)
+        self.info = _XScreenSaverInfo()
+        if not self.xss.XScreenSaverQueryInfo(self.display, self.root, ctypes.byref(self.info)):
+            self.close()
+            raise OSError("MIT-SCREEN-SAVER extension is not available")
+
+    def idle_seconds(self):
+        if not self.xss.XScreenSaverQueryInfo(self.display, self.root, ctypes.byref(self.info)):
+            return None
+        return self.info.idle / 1000
+
+    def close(self):
+        if self.display:
+            self.x11.XCloseDisplay(self.display)
+            self.display = None
+
+
+class ProcInterruptsSource:
+    """Время без ввода по счётчикам прерываний клавиатуры и мыши в /proc/interrupts (Linux).
+
+    Работает без X11 (консоль, Wayland), но видит только устройства со своей
+    строкой прерываний (PS/2, часть HID); USB-устройства на общем контроллере
+    не учитываются. OSError, если таких строк нет.
+    """
+
+    def __init__(self, path="/proc/interrupts", clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.count = self._read()
+        if self.count is None:
+            raise OSError(f"No keyboard or mouse interrupts in {path}")
+        self.last_input = clock()
+
+    def _read(self):
+        with open(self.path, 'rb') as f:
+            lines = [line for line in f if any(name in line.lower() for name in INPUT_IRQ_NAMES)]
+        if not lines:
+            return None
+        total = 0
+        for line in lines:
+            # "  1:  1234  5678  IO-APIC  1-edge  i8042": числа по процессорам после номера
+            for field in line.split()[1:]:
+                if not field.isdigit():
+                    break
+                total += int(field)
+        return total
+
+    def idle_seconds(self):
+        count = self._read()
+        now = self.clock()
+        if count != self.count:
+            self.count = count
+            self.last_input = now
+        return now - self.last_input
+
+    def close(self):
+        pass
+
+
+class FakeIdleSource:
+    """Источник для проверок с подменённым временем: ввод отмечается вызовом touch()."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.last_input = clock()
+
+    def touch(self):
+        self.last_input = self.clock()
+
+    def idle_seconds(self):
+        return (self.clock() - self.last_input).total_seconds()
+
+    def close(self):
+        pass
+
+
+def default_source():
+    """X11, если есть дисплей, иначе /proc/interrupts; None, если ни один не доступен."""
+    if os.environ.get("DISPLAY"):
+        try:
+            return X11IdleSource()
+        except OSError:
+            pass
+    try:
+        return ProcInterruptsSource()
+    except OSError:
+        return None
+
+
+class IdleDetector:
+    """Находит перерывы без ввода по периодическим замерам источника.
+
+    tick() вызывается по таймеру и стоит один запрос к источнику. Перерыв
+    длится от последнего ввода до последнего замера, на котором ввода ещё
+    не было, поэтому активное время никогда не вырезается. split() режет
+    сессию по найденным перерывам.
+    """
+
+    def __init__(self, source, threshold=IDLE_THRESHOLD, clock=local_now):
+        self.source = source
+        self.threshold = threshold.total_seconds()
+        self.clock = clock
+        # Закрытые перерывы (начало, конец) по времени
+        self.gaps = []
+        # Текущий перерыв: последний ввод и последний замер без ввода
+        self.idle_since = None
+        self.idle_seen = None
+
+    def tick(self):
+        idle = self.source.idle_seconds()
+        if idle is None:
+            return
+        now = self.clock()
+        last_input = now - timedelta(seconds=idle)
+        if self.idle_since is not None and last_input > self.idle_seen:
+            # Ввод был после прошлого замера: перерыв закончился
+            self.gaps.append((self.idle_since, self.idle_seen))
+            self.idle_since = None
+        if idle >= self.threshold:
+            if self.idle_since is None:
+                self.idle_since = last_input
+            self.idle_seen = now
+
+    def current_gaps(self):
+        """Закрытые перерывы и идущий сейчас (до последнего замера)."""
+        if self.idle_since is None:
+            return list(self.gaps)
+        return self.gaps + [(self.idle_since, self.idle_seen)]
+
+    def split(self, start, end):
+        """Части [start, end) между перерывами; без перерывов - [(start, end)]."""
+        segments = []
+        for gap_start, gap_end in self.current_gaps():
+            if gap_end <= start or gap_start >= end:
+                continue
+            if gap_start > start:
+                segments.append((start, gap_start))
+            start = max(start, gap_end)
+        if start < end:
+            segments.append((start, end))
+        return segments
+
+    def discard_before(self, moment):
+        """Забывает перерывы, закончившиеся до moment."""
+        self.gaps = [gap for gap in self.gaps if gap[1] > moment]
+
+    def close(self):
+        self.source.close()
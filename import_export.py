@@ -0,0 +1,421 @@
+"""Потоковый импорт и экспорт активностей в CSV, iCalendar (.ics) и JSON Lines.
+
+Пример:
+    python import_export.py import old_log.csv
+    python import_export.py import calendar.ics --store activities.db
+    python import_export.py import activities.json --store activities.jsonl
+    python import_export.py export history.csv --start 2024-01-01 --end 2024-12-31
+    python import_export.py export history.ics --store activities.db
+
+Файлы читаются и пишутся пачками в отдельном потоке, память не зависит от
+их размера. Записи, чья категория (с учётом старых имён) и момент начала
+уже есть в хранилище, при импорте пропускаются.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from activity import to_epoch_us
+from categories import get_registry
+from storage import (
+    DEFAULT_STORE_PATH, FIELDS, PartitionedStorage, batched, is_partition_dir, iter_legacy_json, open_storage
+)
+
+IMPORT_FORMATS = ("csv", "ics", "jsonl", "json")
+EXPORT_FORMATS = ("csv", "ics", "jsonl")
+
+# Сколько готовых пачек может ждать между потоками чтения и записи
+QUEUE_DEPTH = 4
+
+ICS_TIME = "%Y%m%dT%H%M%S"
+
+_DONE = object()
+
+
+def detect_format(path, formats):
+    fmt = os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in formats:
+        raise ValueError(f"Cannot guess the format of {path}, use --format ({', '.join(formats)})")
+    return fmt
+
+
+def with_offset(moment):
+    """Время без смещения считается местным; известное смещение сохраняется."""
+    return moment if moment.tzinfo is not None else moment.astimezone()
+
+
+def normalize(record):
+    """Запись в формате хранилища или None, если её нельзя сохранить.
+
+    Время приводится к ISO-виду datetime.isoformat() со смещением от UTC
+    (время без смещения считается местным), чтобы выборки по периоду и
+    проверка дубликатов сравнивали одинаковые строки.
+    """
+    name = (record.get("name") or "").strip()
+    if not name:
+        return None
+    # Старые локализованные имена категорий сразу заменяются ключами
+    name = get_registry().key_of(name)
+    try:
+        start = with_offset(datetime.fromisoformat(record["start"])) if record.get("start") else None
+        end = with_offset(datetime.fromisoformat(record["end"])) if record.get("end") else None
+    except (TypeError, ValueError):
+        return None
+    duration = record.get("duration") or (str(end - start) if start and end else None)
+    return {
+        "name": name,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "duration": duration,
+        "note": record.get("note") or ""
+    }
+
+
+def canonical_key(name, start):
+    """(ключ категории, момент начала в микросекундах UTC) - по нему записи считаются одинаковыми."""
+    return get_registry().key_of(name), to_epoch_us(with_offset(datetime.fromisoformat(start)))
+
+
+def stored_forms(activity):
+    """Ключи (name, start), под которыми копия записи может уже лежать в хранилище.
+
+    Хранилища сравнивают строки как есть, а записи до миграций хранят
+    старое имя категории и местное время без смещения.
+    """
+    start = datetime.fromisoformat(activity["start"])
+    local = start.astimezone()
+    starts = {start.isoformat(), local.isoformat(), local.replace(tzinfo=None).isoformat()}
+    return {(name, value) for name in get_registry().all_names(activity["name"]) for value in starts}
+
+
+def existing_canonical_keys(storage, activities):
+    """canonical_key записей хранилища, совпадающих с какой-то из activities."""
+    forms = set()
+    for activity in activities:
+        forms |= stored_forms(activity)
+    return {canonical_key(name, start) for name, start in storage.existing_keys(forms)}
+
+
+def read_csv(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield {}
+
+
+def ics_unescape(value):
+    result = []
+    i = 0
+    while i < len(value):
+        if value[i] == "\\" and i + 1 < len(value):
+            i += 1
+            result.append("\n" if value[i] in "nN" else value[i])
+        else:
+            result.append(value[i])
+        i += 1
+    return "".join(result)
+
+
+def ics_escape(value):
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def ics_time(value, params):
+    """DTSTART/DTEND -> ISO-строка (UTC переводится в местное время со смещением)."""
+    if "VALUE=DATE" in params or len(value) == 8:
+        return datetime.strptime(value, "%Y%m%d").isoformat()
+    if value.endswith("Z"):
+        moment = datetime.strptime(value[:-1], ICS_TIME).replace(tzinfo=timezone.utc)
+        return moment.astimezone().isoformat()
+    # Плавающее время или TZID - считаем локальным
+    return datetime.strptime(value, ICS_TIME).isoformat()
+
+
+def iter_ics_lines(f):
+    """Строки календаря со склеенными продолжениями (RFC 5545, 3.1)."""
+    current = None
+    for line in f:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def read_ics(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        event = None
+        for line in iter_ics_lines(f):
+            head, _, value = line.partition(":")
+            prop, _, params = head.partition(";")
+            prop = prop.upper()
+            if prop == "BEGIN" and value.upper() == "VEVENT":
+                event = {}
+            elif prop == "END" and value.upper() == "VEVENT" and event is not None:
+                yield event
+                event = None
+            elif event is None:
+                continue
+            elif prop == "SUMMARY":
+                event["name"] = ics_unescape(value)
+            elif prop == "DESCRIPTION":
+                event["note"] = ics_unescape(value)
+            elif prop in ("DTSTART", "DTEND"):
+                field = "start" if prop == "DTSTART" else "end"
+                try:
+                    # Точное время из X-TIMETRACKER-* важнее округлённого до секунд
+                    event.setdefault(field, ics_time(value, params.upper()))
+                except ValueError:
+                    event[field] = value
+            elif prop in ("X-TIMETRACKER-START", "X-TIMETRACKER-END"):
+                event["start" if prop.endswith("START") else "end"] = value
+
+
+READERS = {
+    "csv": read_csv,
+    "ics": read_ics,
+    "jsonl": read_jsonl,
+    "json": iter_legacy_json,
+}
+
+
+def write_csv(f, batch, first):
+    writer = csv.DictWriter(f, FIELDS, extrasaction='ignore')
+    if first:
+        writer.writeheader()
+    writer.writerows(batch)
+
+
+def write_jsonl(f, batch, first):
+    f.write("".join(json.dumps(activity, ensure_ascii=False) + "\n" for activity in batch))
+
+
+def fold_ics_line(line):
+    """Разбивает строку на части не длиннее 75 байт, не разрывая символы UTF-8."""
+    data = line.encode('utf-8')
+    parts = []
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        while data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(data[:cut])
+        data = data[cut:]
+        limit = 74  # у продолжения первый байт - пробел
+    parts.append(data)
+    return "\r\n ".join(part.decode('utf-8') for part in parts) + "\r\n"
+
+
+def ics_format(value):
+    """ISO-строка -> время iCalendar: в UTC ("Z"), если известно смещение, иначе плавающее."""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        return moment.strftime(ICS_TIME)
+    return moment.astimezone(timezone.utc).strftime(ICS_TIME) + "Z"
+
+
+def ics_event(activity, stamp):
+    uid = hashlib.sha1(f"{activity['name']}|{activity['start']}".encode('utf-8')).hexdigest()
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}@time-tracker",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{ics_format(activity['start'])}",
+        f"X-TIMETRACKER-START:{activity['start']}",
+    ]
+    if activity.get("end"):
+        lines.append(f"DTEND:{ics_format(activity['end'])}")
+        lines.append(f"X-TIMETRACKER-END:{activity['end']}")
+    lines.append(f"SUMMARY:{ics_escape(activity['name'])}")
+    if activity.get("note"):
+        lines.append(f"DESCRIPTION:{ics_escape(activity['note'])}")
+    lines.append("END:VEVENT")
+    return "".join(fold_ics_line(line) for line in lines)
+
+
+def write_ics(f, batch, first):
+    stamp = datetime.now(timezone.utc).strftime(ICS_TIME) + "Z"
+    if first:
+        f.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Time Tracker//Activities//EN\r\n")
+    # Календарь не умеет событий без начала
+    f.write("".join(ics_event(activity, stamp) for activity in batch if activity.get("start")))
+
+
+WRITERS = {
+    "csv": write_csv,
+    "ics": write_ics,
+    "jsonl": write_jsonl,
+}
+
+
+def background(make_iterable, depth=QUEUE_DEPTH):
+    """Выполняет make_iterable() в отдельном потоке и отдаёт его элементы.
+
+    Очередь ограничена depth элементами, поэтому чтение не убегает вперёд
+    записи и память остаётся постоянной. Ошибка потока пробрасывается сюда.
+    """
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in make_iterable():
+                if stop.is_set():
+                    return
+                items.put(item)
+            items.put(_DONE)
+        except BaseException as e:
+            items.put(e)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Потребитель остановился раньше: отпускаем поток-производитель
+        stop.set()
+        while thread.is_alive():
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                thread.join(0.05)
+
+
+def open_target(store_path):
+    # Импорт истории в каталог партиций не должен запечатывать месяцы посреди загрузки
+    if is_partition_dir(store_path):
+        return PartitionedStorage(store_path, seal=False)
+    return open_storage(store_path)
+
+
+def import_file(path, store_path=DEFAULT_STORE_PATH, fmt=None):
+    """Импортирует файл в хранилище. Возвращает (добавлено, дубликатов, некорректных)."""
+    fmt = fmt or detect_format(path, IMPORT_FORMATS)
+    reader = READERS[fmt]
+    invalid = 0
+
+    def records():
+        nonlocal invalid
+        for record in reader(path):
+            activity = normalize(record)
+            if activity is None:
+                invalid += 1
+            else:
+                yield activity
+
+    storage = open_target(store_path)
+    imported = duplicates = 0
+    try:
+        for batch in background(lambda: batched(records())):
+            existing = existing_canonical_keys(storage, [a for a in batch if a["start"]])
+            new = []
+            for activity in batch:
+                if activity["start"]:
+                    key = canonical_key(activity["name"], activity["start"])
+                    if key in existing:
+                        duplicates += 1
+                        continue
+                    existing.add(key)
+                new.append(activity)
+            if new:
+                storage.append_many(new)
+            imported += len(new)
+        if isinstance(storage, PartitionedStorage):
+            storage.seal_closed_months()
+    finally:
+        storage.close()
+    return imported, duplicates, invalid
+
+
+def export_file(path, store_path=DEFAULT_STORE_PATH, fmt=None, start=None, end=None):
+    """Выгружает хранилище (или период [start, end]) в файл. Возвращает число записей."""
+    fmt = fmt or detect_format(path, EXPORT_FORMATS)
+    write = WRITERS[fmt]
+
+    def store_batches():
+        # Соединение SQLite создаётся в том же потоке, который из него читает
+        storage = open_storage(store_path)
+        try:
+            if start or end:
+                activities = storage.iter_range(start or date.min, end or date.max - timedelta(days=1))
+            else:
+                activities = storage.iter_all()
+            yield from batched(activities)
+        finally:
+            storage.close()
+
+    count = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='' if fmt in ("csv", "ics") else None) as f:
+        first = True
+        for batch in background(store_batches):
+            write(f, batch, first)
+            first = False
+            count += len(batch)
+        if first:
+            write(f, [], True)
+        if fmt == "ics":
+            f.write("END:VCALENDAR\r\n")
+    os.replace(tmp_path, path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export activities as CSV, iCalendar or JSON Lines.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="file -> store (duplicates by name and start are skipped)")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=IMPORT_FORMATS, help="default: from the file extension")
+    export_parser = commands.add_parser("export", help="store -> file")
+    export_parser.add_argument("file")
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, help="default: from the file extension")
+    export_parser.add_argument("--start", type=date.fromisoformat, help="first day (YYYY-MM-DD)")
+    export_parser.add_argument("--end", type=date.fromisoformat, help="last day (YYYY-MM-DD)")
+    for command_parser in (import_parser, export_parser):
+        command_parser.add_argument("--store", default=DEFAULT_STORE_PATH,
+                                    help="activity store (.db, .jsonl or a partition directory)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        if args.command == "import":
+            imported, duplicates, invalid = import_file(args.file, args.store, args.format)
+            print(f"Imported {imported} activities into {args.store} "
+                  f"({duplicates} duplicates, {invalid} invalid skipped)")
+        else:
+            count = export_file(args.file, args.store, args.format, args.start, args.end)
+            print(f"Exported {count} activities to {args.file}")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"Done in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+"""Необязательные замеры горячих путей: сохранение, выборка, агрегация, отрисовка.
+
+Включаются переменной окружения (или флагом --metrics у trackerapp.py):
+    TIMETRACKER_METRICS=1            задержки, число записей и прочитанные байты
+    TIMETRACKER_METRICS=cprofile     плюс cProfile внешних вызовов -> metrics.prof
+    TIMETRACKER_METRICS=tracemalloc  плюс пиковая память вызовов и топ выделений
+    TIMETRACKER_METRICS_FILE=path    файл метрик (по умолчанию metrics.jsonl)
+
+Каждый вызов пишется строкой JSON, при выходе - сводка с гистограммами
+задержек. Файл ротируется по размеру. Выключенные замеры почти ничего не стоят.
+"""
+import atexit
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from logging.handlers import RotatingFileHandler
+
+METRICS_ENV = "TIMETRACKER_METRICS"
+METRICS_FILE_ENV = "TIMETRACKER_METRICS_FILE"
+DEFAULT_METRICS_PATH = "metrics.jsonl"
+
+MODES = ("metrics", "cprofile", "tracemalloc")
+
+# Ротация файла метрик
+MAX_BYTES = 1 << 20
+BACKUP_COUNT = 3
+
+# Верхние границы корзин гистограммы задержек, мс (последняя корзина - всё, что больше)
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Сколько мест выделения памяти показывать в режиме tracemalloc
+TOP_ALLOCATIONS = 20
+
+
+class _State:
+    def __init__(self):
+        self.enabled = False
+        self.mode = None
+        self.path = None
+        self.logger = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stats = {}
+        self.profile = None
+        # Сколько байт добавляет к счётчику само чтение /proc/self/io
+        self.probe_bytes = 0
+
+
+_state = _State()
+
+
+def read_bytes():
+    """Сколько байт процесс прочитал из файлов и сокетов (Linux), иначе None."""
+    try:
+        with open("/proc/self/io", 'rb') as f:
+            for line in f:
+                if line.startswith(b"rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def enable(mode="metrics", path=None):
+    """Включает замеры в режиме mode и пишет их в path."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown metrics mode {mode}, expected one of {', '.join(MODES)}")
+    if _state.enabled:
+        return
+    _state.mode = mode
+    _state.path = path or os.environ.get(METRICS_FILE_ENV) or DEFAULT_METRICS_PATH
+    logger = logging.getLogger("timetracker.metrics")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = RotatingFileHandler(_state.path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding='utf-8')
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    _state.logger = logger
+    first = read_bytes()
+    _state.probe_bytes = read_bytes() - first if first is not None else 0
+    if mode == "cprofile":
+        _state.profile = cProfile.Profile()
+    elif mode == "tracemalloc":
+        tracemalloc.start()
+    _state.enabled = True
+    atexit.register(disable)
+
+
+def enable_from_env():
+    value = os.environ.get(METRICS_ENV, "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return
+    enable(value if value in MODES else "metrics")
+
+
+def disable():
+    """Пишет сводку и выключает замеры."""
+    if not _state.enabled:
+        return
+    flush()
+    _state.enabled = False
+    if _state.profile is not None:
+        _state.profile.dump_stats(os.path.splitext(_state.path)[0] + ".prof")
+        _state.profile = None
+    if tracemalloc.is_tracing():
+        top = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+        _write({"event": "allocations", "top": [
+            {"where": str(stat.traceback[0]), "bytes": stat.size, "count": stat.count} for stat in top
+        ]})
+        tracemalloc.stop()
+    for handler in list(_state.logger.handlers):
+        _state.logger.removeHandler(handler)
+        handler.close()
+
+
+def _write(entry):
+    _state.logger.info(json.dumps(entry, ensure_ascii=False))
+
+
+def flush():
+    """Пишет сводку: вызовы, записи, байты и гистограммы задержек по каждой функции."""
+    if not _state.enabled:
+        return
+    with _state.lock:
+        summary = {name: dict(stats, histogram=list(stats["histogram"])) for name, stats in _state.stats.items()}
+    _write({"event": "summary", "time": time.time(), "bounds_ms": HISTOGRAM_BOUNDS_MS, "functions": summary})
+
+
+def add_records(count):
+    """Добавляет число обработанных записей к текущему замеряемому вызову."""
+    if _state.enabled:
+        spans = getattr(_state.local, "spans", None)
+        if spans:
+            spans[-1]["records"] += count
+
+
+def _record(name, seconds, records, bytes_read, peak):
+    milliseconds = seconds * 1000
+    bucket = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if milliseconds <= bound), len(HISTOGRAM_BOUNDS_MS))
+    with _state.lock:
+        stats = _state.stats.get(name)
+        if stats is None:
+            stats = _state.stats[name] = {
+                "calls": 0, "seconds": 0.0, "max_ms": 0.0, "records": 0, "bytes": 0,
+                "histogram": [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+            }
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["max_ms"] = max(stats["max_ms"], milliseconds)
+        stats["records"] += records
+        stats["bytes"] += bytes_read or 0
+        stats["histogram"][bucket] += 1
+    entry = {"event": "call", "time": time.time(), "name": name, "ms": round(milliseconds, 3), "records": records}
+    if bytes_read is not None:
+        entry["bytes"] = bytes_read
+    if peak is not None:
+        entry["peak_bytes"] = peak
+    _write(entry)
+
+
+def instrumented(name):
+    """Декоратор: замеряет вызовы функции под именем name, если замеры включены.
+
+    Число записей берётся из len() результата-списка; функции с другим
+    результатом сообщают его сами через add_records().
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return function(*args, **kwargs)
+
+            spans = getattr(_state.local, "spans", None)
+            if spans is None:
+                spans = _state.local.spans = []
+            span = {"records": 0}
+            outermost = not spans
+            spans.append(span)
+            profile = _state.profile if outermost and threading.current_thread() is threading.main_thread() else None
+            tracing = tracemalloc.is_tracing()
+            if tracing and outermost:
+                tracemalloc.reset_peak()
+                memory_before = tracemalloc.get_traced_memory()[0]
+            bytes_before = read_bytes()
+            started = time.perf_counter()
+            if profile is not None:
+                profile.enable()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                seconds = time.perf_counter() - started
+                bytes_after = read_bytes()
+                peak = tracemalloc.get_traced_memory()[1] - memory_before if tracing and outermost else None
+                spans.pop()
+            if isinstance(result, list):
+                span["records"] += len(result)
+            _record(
+                name, seconds, span["records"],
+                max(0, bytes_after - bytes_before - _state.probe_bytes)
+                if bytes_before is not None and bytes_after is not None else None,
+                peak
+            )
+            return result
+        return wrapper
+    return decorate
+
+
+enable_from_env()
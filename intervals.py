@@ -0,0 +1,139 @@
+import itertools
+import random
+from datetime import datetime, timedelta, timezone
+
+from activity import local_now
+
+# Конец ещё идущей активности (время везде со смещением от UTC)
+OPEN_END = datetime.max.replace(tzinfo=timezone.utc)
+
+
+class _Node:
+    __slots__ = ("key", "start", "end", "item", "priority", "left", "right", "max_end")
+
+    def __init__(self, key, start, end, item):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.item = item
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+
+def _update(node):
+    node.max_end = node.end
+    if node.left and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _split(node, key):
+    # Делит дерево на (< key) и (>= key)
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        _update(node)
+        return node, right
+    left, right = _split(node.left, key)
+    node.left = right
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class IntervalIndex:
+    """Дерево интервалов (декартово дерево по началу с максимумом конца в узле).
+
+    Хранит открытые и недавние активности в памяти. Вставка, удаление и
+    поиск - O(log n), выборка пересечений - O(log n + k) для k найденных.
+    Открытый интервал (таймер ещё идёт) имеет конец OPEN_END.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.nodes = {}
+        self._ids = itertools.count()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, start, end=None, item=None):
+        """Добавляет интервал [start, end) и возвращает его id; end=None - ещё идёт."""
+        interval_id = next(self._ids)
+        node = _Node((start, interval_id), start, end or OPEN_END, item)
+        left, right = _split(self.root, node.key)
+        self.root = _merge(_merge(left, node), right)
+        self.nodes[interval_id] = node
+        return interval_id
+
+    def remove(self, interval_id):
+        """Удаляет интервал по id."""
+        node = self.nodes.pop(interval_id)
+        left, rest = _split(self.root, node.key)
+        _, right = _split(rest, (node.start, interval_id + 1))
+        self.root = _merge(left, right)
+
+    def close(self, interval_id, end):
+        """Завершает открытый интервал (остановка таймера)."""
+        node = self.nodes[interval_id]
+        self.remove(interval_id)
+        self.nodes[interval_id] = node
+        node.end = end
+        node.left = node.right = None
+        node.max_end = end
+        left, right = _split(self.root, node.key)
+        self.root = _merge(_merge(left, node), right)
+
+    def discard_before(self, moment):
+        """Выбрасывает завершившиеся до moment интервалы, чтобы индекс не рос бесконечно."""
+        for interval_id in [i for i, node in self.nodes.items() if node.end <= moment]:
+            self.remove(interval_id)
+
+    def overlapping(self, start, end):
+        """(start, end, item) всех интервалов, пересекающихся с [start, end), по началу."""
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            # В поддереве нет ничего, что заканчивается позже start
+            if node is None or node.max_end <= start:
+                continue
+            stack.append(node.right if node.start < end else None)
+            if node.start < end and node.end > start:
+                found.append(node)
+            stack.append(node.left)
+        found.sort(key=lambda node: node.key)
+        return [(node.start, None if node.end is OPEN_END else node.end, node.item) for node in found]
+
+    def running_at(self, moment):
+        """Интервалы, которые шли в момент moment."""
+        return self.overlapping(moment, moment + timedelta(microseconds=1))
+
+    def coverage(self, start, end, now=None):
+        """Время внутри [start, end), когда шла хотя бы одна активность (объединение)."""
+        now = now or local_now()
+        total = timedelta()
+        covered_until = start
+        for interval_start, interval_end, _ in self.overlapping(start, end):
+            piece_start = max(interval_start, covered_until)
+            piece_end = min(interval_end or now, end)
+            if piece_end > piece_start:
+                total += piece_end - piece_start
+                covered_until = piece_end
+        return total
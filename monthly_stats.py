@@ -1,6 +1,11 @@
-import json
 import matplotlib.pyplot as plt
+from matplotlib import cm
 from datetime import datetime, timedelta
+from storage import DEFAULT_STORE_PATH
+from columnar import to_time_data
+from stats_engine import aggregate
+from categories import get_registry
+from instrumentation import instrumented
 
 # Перевод текста
 translations = {
@@ -8,65 +13,31 @@ translations = {
         "title": "Распределение времени по категориям за месяц",
         "x_label": "День месяца",
         "y_label": "Часы",
-        "categories": {
-            "study": "Учеба",
-            "homework": "Дз",
-            "relax": "Отдых",
-            "other": "Другое"
-        },
     },
     "en": {
         "title": "Time Distribution by Categories (Monthly)",
         "x_label": "Day of the Month",
         "y_label": "Hours",
-        "categories": {
-            "study": "Study",
-            "homework": "Homework",
-            "relax": "Relax",
-            "other": "Other"
-        },
     }
 }
 
-def read_activities(file_path):
-    """Чтение данных из файла activities.json."""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)["activities"]
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-def process_monthly_data(activities, category_keys):
-    """Группировка данных за месяц по дням."""
-    time_data = {key: [0] * 31 for key in category_keys}  # 31 день
-    for activity in activities:
-        name = activity["name"]
-        start = activity.get("start")
-        end = activity.get("end")
-
-        # Проверка, что start и end - строки
-        if name in category_keys and start and end:
-            try:
-                start_time = datetime.fromisoformat(start)
-                end_time = datetime.fromisoformat(end)
-                duration_hours = (end_time - start_time).total_seconds() / 3600
-
-                day_of_month = start_time.day - 1
-                time_data[name][day_of_month] += duration_hours
-            except ValueError:
-                # Логирование ошибки для некорректных данных
-                print(f"Ошибка формата времени в активности: {activity}")
-    return time_data
-
-def plot_monthly_statistics(time_data, language="ru", output_file=None):
-    """Построение графика за месяц."""
+@instrumented("monthly.read_monthly_data")
+def read_monthly_data(file_path, category_keys, start_of_month, end_of_month):
+    """Часы по дням месяца с разрезанием активностей по полуночи."""
+    _, totals = aggregate(file_path, category_keys, start_of_month, end_of_month + timedelta(days=1), "day")
+    time_data = to_time_data(totals, category_keys)
+    # График всегда рисует 31 день, короткие месяцы дополняем нулями
+    return {key: hours + [0] * (31 - len(hours)) for key, hours in time_data.items()}
+
+@instrumented("monthly.draw_monthly_statistics")
+def draw_monthly_statistics(fig, time_data, language="ru"):
+    """Рисует месячный график на уже созданной фигуре (старое содержимое стирается)."""
     lang_data = translations[language]
     title = lang_data["title"]
-    categories = lang_data["categories"]
     days = [str(i + 1) for i in range(31)]
 
-    category_keys = list(categories.keys())
-    translated_categories = [categories[key] for key in category_keys]
+    category_keys = list(time_data)
+    translated_categories = [get_registry().label(key, language) for key in category_keys]
 
     total_time_per_category = [sum(time_data[key]) for key in category_keys]
     total_time = sum(total_time_per_category)
@@ -74,7 +45,8 @@ def plot_monthly_statistics(time_data, language="ru", output_file=None):
         (time / total_time) * 100 if total_time > 0 else 0 for time in total_time_per_category
     ]
 
-    fig, ax = plt.subplots(2, 1, figsize=(14, 8), gridspec_kw={'height_ratios': [4, 1]})
+    fig.clear()
+    ax = fig.subplots(2, 1, gridspec_kw={'height_ratios': [4, 1]})
 
     # Верхняя часть: по дням
     bottom_values = [0] * 31
@@ -97,13 +69,19 @@ def plot_monthly_statistics(time_data, language="ru", output_file=None):
     ax[1].bar(
         translated_categories,
         percentage_distribution,
-        color=[plt.cm.tab10(i / len(category_keys)) for i in range(len(category_keys))]
+        color=[cm.tab10(i / len(category_keys)) for i in range(len(category_keys))]
     )
     ax[1].set_ylabel("%")
     ax[1].set_ylim(0, 100)
     ax[1].grid(axis='y')
 
-    plt.tight_layout()
+    fig.tight_layout()
+
+@instrumented("monthly.plot_monthly_statistics")
+def plot_monthly_statistics(time_data, language="ru", output_file=None):
+    """Построение графика за месяц."""
+    fig = plt.figure(figsize=(14, 8))
+    draw_monthly_statistics(fig, time_data, language)
 
     # Сохранение графика в файл, если указан output_file
     if output_file:
@@ -113,25 +91,15 @@ def plot_monthly_statistics(time_data, language="ru", output_file=None):
         plt.show()
 
 if __name__ == "__main__":
-    activities = read_activities("activities.json")
-    category_keys = ["study", "homework", "relax", "other"]
+    category_keys = get_registry().keys()
 
-    # Фильтрация данных за текущий месяц
-    today = datetime.today()
+    # Границы текущего месяца
+    today = datetime.today().date()
     start_of_month = today.replace(day=1)
     end_of_month = (start_of_month + timedelta(days=31)).replace(day=1) - timedelta(days=1)
 
-    # Фильтрация активностей по дате
-    monthly_activities = [
-        activity for activity in activities
-        if activity.get("start") and activity.get("end")  # Проверка, что start и end существуют
-        and isinstance(activity["start"], str)  # Проверка, что start - строка
-        and isinstance(activity["end"], str)  # Проверка, что end - строка
-        and start_of_month <= datetime.fromisoformat(activity["start"]) <= end_of_month
-    ]
-
-    # Обработка данных
-    time_data = process_monthly_data(monthly_activities, category_keys)
+    # Часы по дням месяца из дневных агрегатов (не больше 31 строки на категорию)
+    time_data = read_monthly_data(DEFAULT_STORE_PATH, category_keys, start_of_month, end_of_month)
 
     # Путь для сохранения графика
     output_file = "doc/img/your_monthly_stats.jpg"
@@ -0,0 +1,111 @@
+import queue
+import threading
+import time
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from instrumentation import add_records, instrumented
+from storage import open_storage
+
+# Сколько ждать следующие записи, чтобы сохранить их одной пачкой
+COALESCE_DELAY = 0.2
+
+# Через сколько секунд повторить сохранение после ошибки
+RETRY_INTERVAL = 5.0
+
+_STOP = object()
+
+
+class BackgroundWriter(QThread):
+    """Фоновый поток, который сохраняет завершённые активности.
+
+    GUI только кладёт запись в очередь, а поток собирает всё, что пришло
+    за COALESCE_DELAY, и пишет одной транзакцией. Результат сообщается
+    сигналами saved(количество) и failed(текст ошибки).
+    """
+
+    saved = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path=None, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.queue = queue.Queue()
+        self.pending = []
+
+    def submit(self, record):
+        """Ставит запись в очередь на сохранение (не блокирует GUI)."""
+        self.queue.put(record)
+
+    def flush(self, timeout=None):
+        """Ждёт, пока всё из очереди будет записано. True, если ничего не осталось."""
+        if not self.isRunning():
+            return not self.pending and self.queue.empty()
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+        return done.is_set() and not self.pending
+
+    def close(self):
+        """Сохраняет оставшиеся записи и останавливает поток.
+
+        Возвращает False, если часть записей так и не удалось сохранить.
+        """
+        if self.isRunning():
+            self.queue.put(_STOP)
+            self.wait()
+        return not self.pending
+
+    def run(self):
+        # Соединение с SQLite должно принадлежать этому потоку
+        storage = open_storage(self.path)
+        stopping = False
+        try:
+            while not stopping:
+                try:
+                    item = self.queue.get(timeout=RETRY_INTERVAL if self.pending else None)
+                except queue.Empty:
+                    self._write(storage)
+                    continue
+
+                flush_events = []
+                deadline = time.monotonic() + COALESCE_DELAY
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                    elif isinstance(item, threading.Event):
+                        flush_events.append(item)
+                    else:
+                        self.pending.append(item)
+
+                    # Флаш и остановка не ждут остальных записей
+                    remaining = 0 if (flush_events or stopping) else deadline - time.monotonic()
+                    try:
+                        item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                self._write(storage)
+                for event in flush_events:
+                    event.set()
+        finally:
+            storage.close()
+
+    def _write(self, storage):
+        if not self.pending:
+            return
+        try:
+            self._append(storage)
+        except Exception as e:
+            # Записи остаются в pending и будут сохранены при следующей попытке
+            self.failed.emit(str(e))
+            return
+        count = len(self.pending)
+        self.pending = []
+        self.saved.emit(count)
+
+    @instrumented("writer.append_many")
+    def _append(self, storage):
+        # Замеряется сама запись пачки в хранилище, а не постановка в очередь
+        add_records(len(self.pending))
+        storage.append_many(self.pending)
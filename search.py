@@ -0,0 +1,65 @@
+"""Поиск активностей по словам заметок с фильтрами по категории и датам.
+
+Пример:
+    python search.py lecture
+    python search.py "chapter 3" --category study --start 2024-09-01 --end 2024-12-31
+    python search.py --category Учеба --limit 20 --store activities.db
+
+Каждое слово запроса ищется как начало слова заметки ("lect" найдёт
+"lecture"), найдены должны быть все слова. В SQLite поиск идёт по
+индексу FTS5, который обновляется при каждом сохранении.
+"""
+import argparse
+from datetime import date
+
+from categories import get_registry
+from instrumentation import instrumented
+from storage import DEFAULT_STORE_PATH, note_words, open_storage
+
+# Сколько найденных записей показывать по умолчанию
+DEFAULT_LIMIT = 100
+
+# Период поиска, если даты не заданы
+FIRST_DAY = date(1900, 1, 1)
+LAST_DAY = date(9999, 12, 30)
+
+
+def category_names(category):
+    """Ключ категории и все её старые имена (записи до миграции хранят их)."""
+    return get_registry().all_names(category)
+
+
+@instrumented("search.notes")
+def search_notes(storage, text="", category=None, start=None, end=None, limit=DEFAULT_LIMIT):
+    """Записи хранилища storage, подходящие под слова text, категорию и период (даты включительно).
+
+    Записи идут от новых к старым, не больше limit (0 или None - все).
+    """
+    names = category_names(category) if category else None
+    return storage.search(note_words(text), start or FIRST_DAY, end or LAST_DAY, names, limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search activity notes.")
+    parser.add_argument("text", nargs="?", default="", help="words to look for in notes")
+    parser.add_argument("--category", help="category key or its label")
+    parser.add_argument("--start", type=date.fromisoformat, help="first day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day (YYYY-MM-DD)")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="maximum number of results (0 - all)")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH)
+    args = parser.parse_args()
+
+    storage = open_storage(args.store)
+    try:
+        found = search_notes(storage, args.text, args.category, args.start, args.end, args.limit)
+    finally:
+        storage.close()
+    for activity in found:
+        print(f"{(activity['start'] or '')[:16].replace('T', ' ')}  {activity['name']:10} "
+              f"{activity.get('duration') or '':>15}  {activity.get('note') or ''}")
+    print(f"Found {len(found)} activities")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
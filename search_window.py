@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+from PyQt5.QtCore import QDate, Qt
+from PyQt5.QtWidgets import (
+    QComboBox, QDateEdit, QHBoxLayout, QLabel, QLineEdit, QListWidget, QPushButton, QVBoxLayout, QWidget
+)
+
+from categories import get_registry
+from search import DEFAULT_LIMIT, search_notes
+
+
+class SearchWindow(QWidget):
+    """Окно поиска по заметкам: слова, категория и период.
+
+    Тексты берутся из переводов главного окна app, поиск идёт по его
+    открытому хранилищу.
+    """
+
+    def __init__(self, app):
+        super().__init__(app, Qt.Window)
+        self.app = app
+        self.setObjectName("searchWindow")
+        self.resize(600, 450)
+
+        self.words = QLineEdit()
+        self.words.returnPressed.connect(self.run_search)
+        self.category = QComboBox()
+        self.category.addItem("", None)
+        for key in app.activity_keys:
+            self.category.addItem("", key)
+
+        today = datetime.today().date()
+        self.start = QDateEdit(QDate(today - timedelta(days=365)))
+        self.end = QDateEdit(QDate(today))
+        for date_edit in (self.start, self.end):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("yyyy-MM-dd")
+
+        self.search_button = QPushButton()
+        self.search_button.setObjectName("menuButton")
+        self.search_button.clicked.connect(self.run_search)
+
+        self.start_label = QLabel()
+        self.end_label = QLabel()
+        filters = QHBoxLayout()
+        for widget in (self.category, self.start_label, self.start, self.end_label, self.end):
+            filters.addWidget(widget)
+
+        self.results = QListWidget()
+        self.status = QLabel("")
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.words)
+        layout.addLayout(filters)
+        layout.addWidget(self.search_button)
+        layout.addWidget(self.results)
+        layout.addWidget(self.status)
+        self.retranslate()
+
+    def retranslate(self):
+        tr = self.app.tr
+        self.setWindowTitle(tr("Search Notes"))
+        self.words.setPlaceholderText(tr("Words from the note"))
+        self.category.setItemText(0, tr("All categories"))
+        for index in range(1, self.category.count()):
+            self.category.setItemText(index, tr(self.category.itemData(index)))
+        self.start_label.setText(tr("From"))
+        self.end_label.setText(tr("To"))
+        self.search_button.setText(tr("Search"))
+
+    def run_search(self):
+        found = search_notes(
+            self.app.storage, self.words.text(), self.category.currentData(),
+            self.start.date().toPyDate(), self.end.date().toPyDate(), DEFAULT_LIMIT
+        )
+        self.results.clear()
+        registry = get_registry()
+        for activity in found:
+            start = (activity["start"] or "")[:16].replace("T", " ")
+            label = self.app.tr(registry.key_of(activity["name"]))
+            self.results.addItem(f"{start}  {label}  {activity.get('duration') or ''}  {activity.get('note') or ''}")
+        self.status.setText(f"{self.app.tr('Found:')} {len(found)}" if found else self.app.tr("Nothing found."))
+
+    def show_search(self):
+        self.retranslate()
+        self.show()
+        self.raise_()
+        self.activateWindow()
+        self.words.setFocus()
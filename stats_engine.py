@@ -0,0 +1,136 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from categories import get_registry
+from columnar import load_columns
+from instrumentation import add_records
+from storage import open_storage, MAX_ACTIVITY_SPAN
+
+# Размеры корзин, которые понимает aggregate
+BUCKETS = ("hour", "day", "week", "month")
+
+MICROSECONDS_PER_HOUR = 3600 * 10 ** 6
+
+
+def as_datetime(value):
+    """date -> полночь этого дня, datetime остаётся как есть."""
+    if isinstance(value, datetime):
+        return value
+    return datetime(value.year, value.month, value.day)
+
+
+def bucket_edges(start, end, bucket):
+    """Границы корзин [edges[i], edges[i + 1]), покрывающих [start, end).
+
+    Первая и последняя корзины обрезаются по start и end. Недели - ISO
+    (с понедельника), месяцы - календарные.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket size: {bucket}")
+    low = np.datetime64(as_datetime(start), 'us')
+    high = np.datetime64(as_datetime(end), 'us')
+    if high <= low:
+        raise ValueError("Empty range: end must be after start")
+
+    if bucket == "hour":
+        first = low.astype('datetime64[h]')
+        edges = np.arange(first, high.astype('datetime64[h]') + 1, np.timedelta64(1, 'h'))
+    elif bucket == "day":
+        first = low.astype('datetime64[D]')
+        edges = np.arange(first, high.astype('datetime64[D]') + 1, np.timedelta64(1, 'D'))
+    elif bucket == "week":
+        first = low.astype('datetime64[D]')
+        # 1970-01-01 - четверг, сдвигаем начало к понедельнику
+        first -= (first.astype(np.int64) + 3) % 7
+        edges = np.arange(first, high.astype('datetime64[D]') + 7, np.timedelta64(7, 'D'))
+    else:
+        first = low.astype('datetime64[M]')
+        edges = np.arange(first, high.astype('datetime64[M]') + 1, np.timedelta64(1, 'M'))
+
+    edges = edges.astype('datetime64[us]')
+    edges = edges[edges < high]
+    edges[0] = low
+    return np.append(edges, high)
+
+
+def split_by_buckets(columns, edges):
+    """Часы по (категория, корзина) с разрезанием активностей на границах корзин."""
+    category_count = len(columns.category_keys)
+    bucket_count = len(edges) - 1
+    totals = np.zeros(category_count * bucket_count)
+
+    starts = np.maximum(columns.starts, edges[0])
+    ends = np.minimum(columns.ends, edges[-1])
+    inside = ends > starts
+    starts, ends, codes = starts[inside], ends[inside], columns.codes[inside]
+    if len(codes) == 0:
+        return totals.reshape(category_count, bucket_count)
+
+    first = np.searchsorted(edges, starts, side='right') - 1
+    last = np.searchsorted(edges, ends - np.timedelta64(1, 'us'), side='right') - 1
+
+    # Каждая активность превращается в столько кусков, сколько корзин она задевает;
+    # обычно это один кусок, так что разворачивание почти ничего не стоит
+    pieces = last - first + 1
+    owner = np.repeat(np.arange(len(codes)), pieces)
+    offset = np.arange(len(owner)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    buckets = first[owner] + offset
+
+    piece_start = np.maximum(starts[owner], edges[buckets])
+    piece_end = np.minimum(ends[owner], edges[buckets + 1])
+    hours = (piece_end - piece_start).astype(np.int64) / MICROSECONDS_PER_HOUR
+
+    totals += np.bincount(codes[owner] * bucket_count + buckets, weights=hours, minlength=len(totals))
+    return totals.reshape(category_count, bucket_count)
+
+
+def group_daily_totals(daily_totals, category_keys, edges):
+    """Сводит готовые часы по (день, категория) в корзины из целых дней."""
+    category_count = len(category_keys)
+    bucket_count = len(edges) - 1
+    totals = np.zeros((category_count, bucket_count))
+    code_of = get_registry().codes_for(category_keys)
+    for (day, name), hours in daily_totals.items():
+        code = code_of.get(name)
+        if code is None:
+            continue
+        index = np.searchsorted(edges, np.datetime64(day, 'us'), side='right') - 1
+        if 0 <= index < bucket_count:
+            totals[code, index] += hours
+    return totals
+
+
+def aggregate(file_path, category_keys, start, end, bucket="day"):
+    """Часы по категориям в корзинах bucket на диапазоне [start, end).
+
+    Возвращает (edges, totals): границы корзин и массив формы
+    (len(category_keys), len(edges) - 1). Для корзин из целых дней
+    используются дневные агрегаты хранилища (для целых месяцев хранилища
+    по месяцам - часы месяцев из manifest), для часовых - сами активности.
+    """
+    edges = bucket_edges(start, end, bucket)
+    whole_days = bucket != "hour" and isinstance(start, date) and not isinstance(start, datetime) \
+        and isinstance(end, date) and not isinstance(end, datetime)
+
+    storage = open_storage(file_path)
+    try:
+        if whole_days and bucket == "month" and start.day == 1 and end.day == 1 and hasattr(storage, "month_totals"):
+            # Хранилище по месяцам отдаёт часы целых месяцев из manifest, не читая партиций
+            months = [str(edge)[:7] for edge in edges[:-1]]
+            month_totals = {(f"{month}-01", name): hours for month in months
+                            for name, hours in storage.month_totals(month).items()}
+            add_records(len(month_totals))
+            return edges, group_daily_totals(month_totals, category_keys, edges)
+        if whole_days:
+            daily_totals = storage.daily_totals(start, end - timedelta(days=1))
+            add_records(len(daily_totals))
+            return edges, group_daily_totals(daily_totals, category_keys, edges)
+
+        first_day = as_datetime(start).date() - MAX_ACTIVITY_SPAN
+        last_day = (as_datetime(end) - timedelta(microseconds=1)).date()
+        columns = load_columns(storage.iter_range(first_day, last_day), category_keys)
+    finally:
+        storage.close()
+    add_records(len(columns))
+    return edges, split_by_buckets(columns, edges)
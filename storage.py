@@ -0,0 +1,1162 @@
+import json
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# Старый формат: один документ {"activities": [...]}, который переписывался целиком
+LEGACY_JSON_PATH = "activities.json"
+
+# Новый формат: одна запись на строку (JSON Lines), только дозапись в конец
+DEFAULT_LOG_PATH = "activities.jsonl"
+
+# Хранилище по умолчанию: SQLite с индексами по времени начала и категории
+DEFAULT_DB_PATH = "activities.db"
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# Сколько секунд ждать, пока другой процесс освободит базу
+SQLITE_TIMEOUT = 30
+
+# Каталог с помесячными файлами-партициями и manifest.json
+DEFAULT_PARTITION_DIR = "activities"
+
+# Переменная окружения с путём к хранилищу по умолчанию (файл .db/.jsonl
+# или каталог партиций, например TIMETRACKER_STORE=activities)
+STORE_ENV = "TIMETRACKER_STORE"
+
+# Хранилище, с которым работают приложение, графики и утилиты
+DEFAULT_STORE_PATH = os.environ.get(STORE_ENV) or DEFAULT_DB_PATH
+
+MANIFEST_NAME = "manifest.json"
+
+# Версия 2: часы в manifest разрезаны по месяцам, в которые они попадают
+MANIFEST_VERSION = 2
+
+# Партиция для записей без времени начала
+UNDATED_PARTITION = "undated"
+
+FIELDS = ("name", "start", "end", "duration", "note")
+
+# Активности длиннее этого не учитываются при поиске тех, что переходят через полночь
+MAX_ACTIVITY_SPAN = timedelta(days=1)
+
+# Версия формата daily_rollup (1 - часы разрезаются по полуночи)
+ROLLUP_VERSION = 1
+
+# Слово заметки для поиска: буквы и цифры (как у токенизатора unicode61 в FTS5)
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+# Сколько самых новых записей периода поиск по заметкам просматривает
+# перебором, прежде чем обращаться к индексу: это быстрее, чем читать
+# строку на каждое совпадение частого слова
+SEARCH_SCAN_LIMIT = 5000
+
+# Размер порции при чтении файлов и пакетной вставке
+CHUNK_SIZE = 1 << 16
+BATCH_SIZE = 10000
+
+
+def iter_legacy_json(file_path, chunk_size=CHUNK_SIZE):
+    """Потоковое чтение массива "activities" из старого activities.json.
+
+    Записи разбираются по одной из буфера фиксированного размера, так что
+    документ любого размера не загружается в память целиком.
+    """
+    decoder = json.JSONDecoder()
+    try:
+        f = open(file_path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return
+
+    with f:
+        buffer = ""
+        eof = False
+
+        def fill():
+            nonlocal buffer, eof
+            chunk = f.read(chunk_size)
+            if chunk:
+                buffer += chunk
+            else:
+                eof = True
+
+        # Пропускаем всё до открывающей скобки массива activities
+        while True:
+            key = buffer.find('"activities"')
+            bracket = buffer.find('[', key) if key != -1 else -1
+            if bracket != -1:
+                buffer = buffer[bracket + 1:]
+                break
+            if eof:
+                return
+            fill()
+
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    print(f"Unexpected end of {file_path}")
+                    return
+                buffer = buffer[pos:]
+                pos = 0
+                fill()
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                activity, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    print(f"Damaged data in {file_path}, stopped reading")
+                    return
+                # Запись не поместилась в буфер целиком - дочитываем
+                buffer = buffer[pos:]
+                pos = 0
+                fill()
+                continue
+            yield activity
+
+
+def read_legacy_json(file_path):
+    """Чтение старого файла activities.json целиком."""
+    return list(iter_legacy_json(file_path))
+
+
+def batched(iterable, size=BATCH_SIZE):
+    """Разбивает поток записей на списки не длиннее size."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Межпроцессная блокировка на время записи (advisory lock на файле lock_path)."""
+    with open(lock_path, 'a+') as f:
+        if os.name == "nt":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def truncate_file(path, size):
+    """Отрезает всё, что было дописано в файл после размера size."""
+    if file_size(path) > size:
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+
+
+def write_journal(journal_path, entry):
+    """Записывает намерение (journal entry) на диск до изменения данных."""
+    with open(journal_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_journal(journal_path):
+    """Незавершённая запись из журнала предзаписи или None."""
+    try:
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    if not text.endswith("\n"):
+        # Сбой при записи самого журнала: данные ещё не трогали
+        os.remove(journal_path)
+        return None
+    return json.loads(text)
+
+
+def is_partition_dir(path):
+    """Каталог или путь без расширения - хранилище с партициями по месяцам."""
+    return os.path.isdir(path) or not os.path.splitext(path)[1]
+
+
+def open_storage(path=None):
+    """Открывает хранилище, выбирая движок по расширению файла (см. is_partition_dir)."""
+    path = path or DEFAULT_STORE_PATH
+    if is_partition_dir(path):
+        return PartitionedStorage(path)
+    if path.endswith(SQLITE_EXTENSIONS):
+        if path == DEFAULT_DB_PATH:
+            return SqliteStorage(path)
+        # Чужие файлы (например, отчёты по другим пользователям) не подхватывают
+        # журналы из текущего каталога
+        return SqliteStorage(path, log_path=None, legacy_path=None)
+    if path.endswith(".json"):
+        # Старый документ читается через журнал рядом с ним
+        return JsonlStorage(path + "l", legacy_path=path)
+    if path == DEFAULT_LOG_PATH:
+        return JsonlStorage(path)
+    return JsonlStorage(path, legacy_path=None)
+
+
+def store_files(path):
+    """Файлы, которые меняются при каждой записи в хранилище path (движок - как в open_storage).
+
+    Для SQLite это и -wal файл: в режиме WAL сама база меняется только
+    при checkpoint. Для каталога с партициями - manifest.json.
+    """
+    path = path or DEFAULT_STORE_PATH
+    if is_partition_dir(path):
+        return [os.path.join(path, MANIFEST_NAME)]
+    if path.endswith(SQLITE_EXTENSIONS):
+        return [path, path + "-wal"]
+    if path.endswith(".json"):
+        # Старый документ только читается, записи идут в журнал рядом
+        return [path + "l"]
+    return [path]
+
+
+def start_bounds(start_date, end_date):
+    """Границы [от, до) для сравнения ISO-строк времени начала."""
+    return start_date.isoformat(), (end_date + timedelta(days=1)).isoformat()
+
+
+def activity_daily_hours(activity):
+    """Часы активности по дням: список (ISO-дата, часы), разрезанный по полуночи.
+
+    Для записей без корректных start/end возвращает пустой список.
+    """
+    start = activity.get("start")
+    end = activity.get("end")
+    if not (isinstance(start, str) and isinstance(end, str)):
+        return []
+    try:
+        start_time = datetime.fromisoformat(start)
+        end_time = datetime.fromisoformat(end)
+    except ValueError:
+        return []
+
+    if (start_time.tzinfo is None) != (end_time.tzinfo is None):
+        return []
+
+    # Обычный случай - активность целиком внутри одного дня (по местным часам);
+    # у времени со смещением разница - настоящая длительность и через переход DST
+    day = start_time.date()
+    if day == end_time.date():
+        if end_time <= start_time:
+            return []
+        return [(day.isoformat(), (end_time - start_time).total_seconds() / 3600)]
+
+    pieces = []
+    while start_time < end_time:
+        # Полночь - со смещением начала: часы переводят ночью, уже после полуночи
+        midnight = datetime.combine(start_time.date() + timedelta(days=1), datetime.min.time(), start_time.tzinfo)
+        piece_end = min(end_time, midnight)
+        pieces.append((start_time.date().isoformat(), (piece_end - start_time).total_seconds() / 3600))
+        start_time = piece_end
+    return pieces
+
+
+def sum_daily_totals(activities):
+    """Суммирование часов по (день, категория) для списка активностей."""
+    totals = {}
+    for activity in activities:
+        for day, hours in activity_daily_hours(activity):
+            key = (day, activity["name"])
+            totals[key] = totals.get(key, 0) + hours
+    return totals
+
+
+def month_split_totals(month, activities):
+    """Часы записей партиции month по категориям, разрезанные по полуночи.
+
+    Возвращает (часы внутри month, {более поздний месяц: часы}).
+    """
+    totals, carry = {}, {}
+    for (day, name), hours in sum_daily_totals(activities).items():
+        target = totals if day[:7] == month else carry.setdefault(day[:7], {})
+        target[name] = target.get(name, 0) + hours
+    return totals, carry
+
+
+def add_hours(totals, hours):
+    for name, value in hours.items():
+        totals[name] = totals.get(name, 0) + value
+
+
+def renamed_hours(hours, mapping):
+    """Часы по категориям после переименования по mapping (совпавшие имена складываются)."""
+    totals = {}
+    for name, value in hours.items():
+        totals[mapping.get(name, name)] = totals.get(mapping.get(name, name), 0) + value
+    return totals
+
+
+def touched_days(activities):
+    """Дни (ISO-даты), в агрегаты которых попадают часы этих активностей."""
+    return {day for activity in activities for day, _ in activity_daily_hours(activity)}
+
+
+def activity_keys(activities):
+    """Множество ключей (name, start), по которым записи считаются одинаковыми."""
+    return {(activity["name"], activity.get("start")) for activity in activities}
+
+
+def note_words(text):
+    """Слова текста в нижнем регистре, как их видит поиск по заметкам."""
+    return WORD_PATTERN.findall((text or "").lower())
+
+
+def search_records(activities, words, names=None, limit=None):
+    """Перебором: записи, в заметке которых каждое из words - начало какого-то слова.
+
+    Результат - от новых к старым, не больше limit записей.
+    """
+    found = []
+    for activity in activities:
+        if names is not None and activity["name"] not in names:
+            continue
+        note = (activity.get("note") or "").lower()
+        # Быстрая проверка подстрокой отсеивает почти все записи до разбора на слова
+        if not all(word in note for word in words):
+            continue
+        tokens = note_words(note)
+        if all(any(token.startswith(word) for token in tokens) for word in words):
+            found.append(activity)
+    found.sort(key=lambda activity: activity["start"], reverse=True)
+    return found[:limit] if limit else found
+
+
+class JsonlStorage:
+    """Журнал активностей в формате JSON Lines.
+
+    Каждая завершённая активность дописывается одной строкой и сбрасывается
+    на диск через fsync, поэтому стоимость сохранения не зависит от размера
+    истории. Запись идёт под файловой блокировкой и через журнал
+    предзаписи (<path>.journal): если процесс упал посреди дозаписи,
+    при следующем открытии или следующей дозаписи (в том числе из
+    другого, уже открытого экземпляра) она будет откатана и повторена целиком.
+    """
+
+    def __init__(self, path=DEFAULT_LOG_PATH, legacy_path=LEGACY_JSON_PATH):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.journal_path = path + ".journal"
+        # Ключи (name, start) уже прочитанной части файла, см. existing_keys
+        self._keys = None
+        self._keys_offset = 0
+        with file_lock(self.lock_path):
+            if legacy_path and not os.path.exists(self.path):
+                self._migrate_legacy_json(legacy_path)
+            self._recover()
+
+    def migrate_legacy_json(self, legacy_path):
+        """Одноразовый перенос данных из {"activities": [...]} в журнал."""
+        with file_lock(self.lock_path):
+            self._migrate_legacy_json(legacy_path)
+
+    def _migrate_legacy_json(self, legacy_path):
+        count = self._rewrite(iter_legacy_json(legacy_path))
+        if count:
+            print(f"Migrated {count} activities from {legacy_path} to {self.path}")
+
+    def append(self, record):
+        """Дописывает одну запись в конец журнала."""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Дописывает пачку записей с одним fsync на всю пачку."""
+        records = list(records)
+        with file_lock(self.lock_path):
+            # Журнал мог остаться от другого процесса, упавшего уже после нашего открытия
+            self._recover()
+            write_journal(self.journal_path, {"size": file_size(self.path), "records": records})
+            self._append_lines(records)
+            os.remove(self.journal_path)
+
+    def _append_lines(self, records):
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _recover(self):
+        self._replay_journal()
+        if self._has_torn_tail():
+            # Прошлая запись оборвалась на середине строки
+            self._rewrite(self.iter_all())
+
+    def _replay_journal(self):
+        entry = read_journal(self.journal_path)
+        if entry is None:
+            return
+        # Откатываем недописанный хвост и повторяем дозапись целиком
+        truncate_file(self.path, entry["size"])
+        self._append_lines(entry["records"])
+        os.remove(self.journal_path)
+        print(f"Recovered {len(entry['records'])} activities from {self.journal_path}")
+
+    def iter_all(self):
+        """Построчное чтение записей журнала.
+
+        Строка без перевода строки в конце файла - это запись, которую
+        другой процесс ещё дописывает (или оборванная сбоем), она пропускается.
+        """
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Skipped damaged record in {self.path}")
+
+    def read_all(self):
+        """Чтение всех записей журнала списком."""
+        return list(self.iter_all())
+
+    def iter_range(self, start_date, end_date, name=None):
+        """Потоковая выборка активностей, начавшихся с start_date по end_date включительно."""
+        low, high = start_bounds(start_date, end_date)
+        for activity in self.iter_all():
+            if isinstance(activity.get("start"), str) and low <= activity["start"] < high \
+                    and (name is None or activity["name"] == name):
+                yield activity
+
+    def query_range(self, start_date, end_date, name=None):
+        """Активности, начавшиеся с start_date по end_date включительно."""
+        return list(self.iter_range(start_date, end_date, name))
+
+    def search(self, words, start_date, end_date, names=None, limit=None):
+        """Поиск по словам заметок за период; у журнала - перебором."""
+        return search_records(self.iter_range(start_date, end_date), words, names, limit)
+
+    def daily_totals(self, start_date, end_date):
+        """Часы по (день, категория) за период; у журнала считаются перебором."""
+        totals = sum_daily_totals(self.iter_range(start_date - MAX_ACTIVITY_SPAN, end_date))
+        low, high = start_date.isoformat(), end_date.isoformat()
+        return {key: hours for key, hours in totals.items() if low <= key[0] <= high}
+
+    def existing_keys(self, keys):
+        """Какие из ключей (name, start) уже есть в журнале.
+
+        Индекс ключей строится при первом вызове, а дальше дочитывается
+        только новый хвост файла, так что повторные проверки не перечитывают журнал.
+        """
+        if self._keys is None or file_size(self.path) < self._keys_offset:
+            self._keys, self._keys_offset = set(), 0
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return set()
+        with f:
+            f.seek(self._keys_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._keys_offset += len(line)
+                try:
+                    activity = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._keys.add((activity["name"], activity.get("start")))
+        return self._keys & set(keys)
+
+    def rename_categories(self, mapping):
+        """Переименовывает категории по словарю {старое имя: новое}. Возвращает число записей."""
+        with file_lock(self.lock_path):
+            if not any(activity["name"] in mapping for activity in self.iter_all()):
+                return 0
+            changed = 0
+
+            def renamed():
+                nonlocal changed
+                for activity in self.iter_all():
+                    if activity["name"] in mapping:
+                        activity["name"] = mapping[activity["name"]]
+                        changed += 1
+                    yield activity
+
+            self._rewrite(renamed())
+            self._keys = None
+        return changed
+
+    def rewrite_records(self, update):
+        """Переписывает журнал через update(пачка записей) -> новые записи.
+
+        update получает записи пачками, чтобы работать векторно.
+        Возвращает число изменённых записей.
+        """
+        changed = 0
+
+        def updated():
+            nonlocal changed
+            for batch in batched(self.iter_all()):
+                new_batch = update(batch)
+                changed += sum(new != old for new, old in zip(new_batch, batch))
+                yield from new_batch
+
+        with file_lock(self.lock_path):
+            self._rewrite(updated())
+            self._keys = None
+        return changed
+
+    def compact(self):
+        """Переписывает журнал начисто, отбрасывая повреждённые строки."""
+        with file_lock(self.lock_path):
+            self._rewrite(self.iter_all())
+
+    def clear(self):
+        """Удаляет все записи журнала."""
+        with file_lock(self.lock_path):
+            self._rewrite([])
+
+    def close(self):
+        pass
+
+    def _has_torn_tail(self):
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return False
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b"\n"
+        except FileNotFoundError:
+            return False
+
+    def _rewrite(self, activities):
+        # Пишем во временный файл и атомарно подменяем им журнал
+        tmp_path = self.path + ".tmp"
+        count = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for activity in activities:
+                f.write(json.dumps(activity, ensure_ascii=False) + "\n")
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return count
+
+
+class SqliteStorage:
+    """Хранилище активностей в SQLite.
+
+    Время начала хранится ISO-строкой, поэтому выборка недели или месяца
+    превращается в запрос по индексу на start, а не в перебор всей истории.
+    Рядом ведётся таблица daily_rollup с часами по (день, категория),
+    разрезанными по полуночи, которая обновляется при каждом сохранении,
+    и полнотекстовый индекс заметок notes_fts (FTS5), который триггеры
+    обновляют при каждой вставке, изменении и удалении записи.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, log_path=DEFAULT_LOG_PATH, legacy_path=LEGACY_JSON_PATH):
+        self.path = path
+        # Создание схемы и миграция - под блокировкой, чтобы два процесса
+        # не перенесли старые данные дважды
+        with file_lock(path + ".lock"):
+            is_new = not os.path.exists(path)
+            # Остальных писателей SQLite дождётся сама (busy timeout)
+            self.conn = sqlite3.connect(path, timeout=SQLITE_TIMEOUT)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self._create_schema()
+            if is_new:
+                self.migrate(log_path, legacy_path)
+
+    def _create_schema(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS activities (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    start TEXT,
+                    "end" TEXT,
+                    duration TEXT,
+                    note TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_activities_start ON activities(start)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_activities_name ON activities(name, start)")
+
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS daily_rollup (
+                    day TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    hours REAL NOT NULL,
+                    PRIMARY KEY (day, name)
+                )
+            """)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < ROLLUP_VERSION:
+            # Агрегатов ещё нет или они посчитаны по старым правилам - считаем один раз
+            self.rebuild_rollup()
+            self.conn.execute(f"PRAGMA user_version = {ROLLUP_VERSION}")
+        self.has_fts = self._create_note_index()
+
+    def _create_note_index(self):
+        """Создаёт индекс заметок; False, если SQLite собран без FTS5 (тогда поиск идёт перебором)."""
+        exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'").fetchone()
+        try:
+            with self.conn:
+                self.conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                        note, content='activities', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 0'
+                    )
+                """)
+                self.conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON activities BEGIN
+                        INSERT INTO notes_fts (rowid, note) VALUES (new.id, new.note);
+                    END
+                """)
+                self.conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON activities BEGIN
+                        INSERT INTO notes_fts (notes_fts, rowid, note) VALUES ('delete', old.id, old.note);
+                    END
+                """)
+                self.conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF note ON activities BEGIN
+                        INSERT INTO notes_fts (notes_fts, rowid, note) VALUES ('delete', old.id, old.note);
+                        INSERT INTO notes_fts (rowid, note) VALUES (new.id, new.note);
+                    END
+                """)
+                if not exists:
+                    # База создана до появления поиска - индексируем старые заметки один раз
+                    self.conn.execute("INSERT INTO notes_fts (notes_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def migrate(self, log_path, legacy_path):
+        """Одноразовый перенос данных из журнала JSON Lines или activities.json."""
+        if log_path and os.path.exists(log_path):
+            source = log_path
+            activities = JsonlStorage(log_path, legacy_path=None).iter_all()
+        elif legacy_path:
+            source = legacy_path
+            activities = iter_legacy_json(legacy_path)
+        else:
+            return
+        count = 0
+        for batch in batched(activities):
+            self.append_many(batch)
+            count += len(batch)
+        if count:
+            print(f"Migrated {count} activities from {source} to {self.path}")
+
+    def append(self, record):
+        """Добавляет одну запись."""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Добавляет пачку записей и обновляет дневные агрегаты одной транзакцией."""
+        records = list(records)
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO activities (name, start, "end", duration, note) VALUES (?, ?, ?, ?, ?)',
+                ([record.get(field) for field in FIELDS] for record in records)
+            )
+            self.conn.executemany(
+                "INSERT INTO daily_rollup (day, name, hours) VALUES (?, ?, ?) "
+                "ON CONFLICT (day, name) DO UPDATE SET hours = hours + excluded.hours",
+                [(day, name, hours) for (day, name), hours in sum_daily_totals(records).items()]
+            )
+
+    def invalidate_days(self, days):
+        """Пересчитывает агрегаты только для затронутых изменением дней.
+
+        days - даты (date или ISO-строки), чьи записи были изменены или удалены.
+        Активности, начавшиеся накануне, учитываются; более длинные (дольше
+        MAX_ACTIVITY_SPAN) - нет, их поправит только rebuild_rollup().
+        """
+        with self.conn:
+            for day in set(days):
+                low = day.isoformat() if hasattr(day, "isoformat") else day
+                # Захватываем и активности, начавшиеся накануне и перешедшие через полночь
+                since, high = start_bounds(datetime.fromisoformat(low).date() - MAX_ACTIVITY_SPAN,
+                                           datetime.fromisoformat(low).date())
+                cursor = self.conn.execute(
+                    'SELECT name, start, "end" FROM activities WHERE start >= ? AND start < ?', (since, high)
+                )
+                totals = sum_daily_totals(dict(zip(("name", "start", "end"), row)) for row in cursor)
+                self.conn.execute("DELETE FROM daily_rollup WHERE day = ?", (low,))
+                self.conn.executemany(
+                    "INSERT INTO daily_rollup (day, name, hours) VALUES (?, ?, ?)",
+                    [(key[0], key[1], hours) for key, hours in totals.items() if key[0] == low]
+                )
+
+    def rebuild_rollup(self):
+        """Полный пересчёт дневных агрегатов по всей истории."""
+        cursor = self.conn.execute('SELECT name, start, "end" FROM activities WHERE start IS NOT NULL')
+        totals = sum_daily_totals(dict(zip(("name", "start", "end"), row)) for row in cursor)
+        with self.conn:
+            self.conn.execute("DELETE FROM daily_rollup")
+            self.conn.executemany(
+                "INSERT INTO daily_rollup (day, name, hours) VALUES (?, ?, ?)",
+                [(day, name, hours) for (day, name), hours in totals.items()]
+            )
+
+    def existing_keys(self, keys):
+        """Какие из ключей (name, start) уже есть в базе (поиск по индексу на start)."""
+        keys = set(keys)
+        starts = list({start for _, start in keys})
+        found = set()
+        for i in range(0, len(starts), 500):
+            chunk = starts[i:i + 500]
+            cursor = self.conn.execute(
+                f"SELECT name, start FROM activities WHERE start IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            found.update(key for key in cursor if key in keys)
+        return found
+
+    def daily_totals(self, start_date, end_date):
+        """Часы по (день, категория) за период из готовых агрегатов."""
+        cursor = self.conn.execute(
+            "SELECT day, name, hours FROM daily_rollup WHERE day >= ? AND day <= ?",
+            (start_date.isoformat(), end_date.isoformat())
+        )
+        return {(day, name): hours for day, name, hours in cursor}
+
+    def iter_all(self):
+        """Потоковое чтение всех записей в порядке добавления."""
+        cursor = self.conn.execute('SELECT name, start, "end", duration, note FROM activities ORDER BY id')
+        for row in cursor:
+            yield dict(zip(FIELDS, row))
+
+    def read_all(self):
+        """Чтение всех записей списком."""
+        return list(self.iter_all())
+
+    def iter_range(self, start_date, end_date, name=None):
+        """Потоковая выборка активностей, начавшихся с start_date по end_date включительно."""
+        low, high = start_bounds(start_date, end_date)
+        query = 'SELECT name, start, "end", duration, note FROM activities WHERE start >= ? AND start < ?'
+        params = [low, high]
+        if name is not None:
+            query += " AND name = ?"
+            params.append(name)
+        cursor = self.conn.execute(query + " ORDER BY start", params)
+        for row in cursor:
+            yield dict(zip(FIELDS, row))
+
+    def query_range(self, start_date, end_date, name=None):
+        """Активности, начавшиеся с start_date по end_date включительно."""
+        return list(self.iter_range(start_date, end_date, name))
+
+    def search(self, words, start_date, end_date, names=None, limit=None):
+        """Активности за период, в заметке которых каждое из words - начало слова.
+
+        Результат - от новых записей к старым (по времени начала). Самые
+        новые SEARCH_SCAN_LIMIT записей периода проверяются перебором: для
+        частых слов limit находок обычно уже среди них. Более старые записи
+        ищутся по индексу notes_fts, где каждое совпадение стоит чтения строки,
+        поэтому он выгоден только для редких слов.
+        """
+        low, high = start_bounds(start_date, end_date)
+        if words and not self.has_fts:
+            return search_records(self.iter_range(start_date, end_date), words, names, limit)
+        if not words:
+            return self._search_query([], low, high, names, limit, inclusive_high=False)
+
+        newest = [dict(zip(FIELDS, row)) for row in self.conn.execute(
+            'SELECT name, start, "end", duration, note FROM activities WHERE start >= ? AND start < ? '
+            "ORDER BY start DESC LIMIT ?", (low, high, SEARCH_SCAN_LIMIT)
+        )]
+        if len(newest) < SEARCH_SCAN_LIMIT:
+            # Весь период уже просмотрен
+            return search_records(newest, words, names, limit)
+        # Записи с тем же началом, что у последней просмотренной, могли не войти в выборку -
+        # их вместе с более старыми ищем по индексу
+        boundary = newest[-1]["start"]
+        found = search_records([activity for activity in newest if activity["start"] > boundary], words, names, limit)
+        if limit and len(found) >= limit:
+            return found
+        return found + self._search_query(
+            words, low, boundary, names, limit - len(found) if limit else None, inclusive_high=True
+        )
+
+    def _search_query(self, words, low, high, names, limit, inclusive_high):
+        # Выборка по индексам: слова - через notes_fts, период и категории - условиями
+        query = 'SELECT a.name, a.start, a."end", a.duration, a.note FROM activities AS a'
+        conditions, params = [], []
+        # Со словами выборку ведёт индекс notes_fts; унарный + не даёт SQLite
+        # вместо этого идти по индексам на start/name и проверять MATCH на каждой строке
+        column = "+a." if words else "a."
+        if words:
+            query += " JOIN notes_fts ON notes_fts.rowid = a.id"
+            conditions.append("notes_fts MATCH ?")
+            params.append(" ".join(f'"{word}"*' for word in words))
+        conditions += [f"{column}start >= ?", f"{column}start <= ?" if inclusive_high else f"{column}start < ?"]
+        params += [low, high]
+        if names is not None:
+            names = list(names)
+            conditions.append(f"{column}name IN ({', '.join('?' * len(names))})")
+            params += names
+        query += " WHERE " + " AND ".join(conditions) + " ORDER BY a.start DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [dict(zip(FIELDS, row)) for row in self.conn.execute(query, params)]
+
+    def rename_categories(self, mapping):
+        """Переименовывает категории по словарю {старое имя: новое}. Возвращает число записей."""
+        changed = 0
+        days = set()
+        with self.conn:
+            for old, new in mapping.items():
+                cursor = self.conn.execute('SELECT start, "end" FROM activities WHERE name = ?', (old,))
+                days.update(touched_days({"start": start, "end": end} for start, end in cursor))
+                changed += self.conn.execute("UPDATE activities SET name = ? WHERE name = ?", (new, old)).rowcount
+        if days:
+            self.invalidate_days(days)
+        return changed
+
+    def rewrite_records(self, update):
+        """Переписывает записи через update(пачка записей) -> новые записи.
+
+        Обновляются только изменившиеся строки, затем пересчитываются агрегаты
+        затронутых дней. Возвращает число изменённых записей.
+        """
+        changed = 0
+        days = set()
+        last_id = 0
+        while True:
+            # Пачками по id, чтобы не держать в памяти всю таблицу
+            rows = self.conn.execute(
+                'SELECT id, name, start, "end", duration, note FROM activities WHERE id > ? ORDER BY id LIMIT ?',
+                (last_id, BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            batch = [dict(zip(FIELDS, row[1:])) for row in rows]
+            changes = []
+            for row, new, old in zip(rows, update(batch), batch):
+                if new != old:
+                    changes.append([new.get(field) for field in FIELDS] + [row[0]])
+                    # Часы старой записи уходят из своих дней, новой - приходят в свои
+                    days.update(touched_days([old, new]))
+            with self.conn:
+                self.conn.executemany(
+                    'UPDATE activities SET name = ?, start = ?, "end" = ?, duration = ?, note = ? WHERE id = ?', changes
+                )
+            changed += len(changes)
+        if days:
+            self.invalidate_days(days)
+        return changed
+
+    def clear(self):
+        """Удаляет все записи."""
+        with self.conn:
+            self.conn.execute("DELETE FROM activities")
+            self.conn.execute("DELETE FROM daily_rollup")
+
+    def close(self):
+        self.conn.close()
+
+
+class PartitionedStorage:
+    """Хранилище, разбитое по месяцам: один файл JSON Lines на месяц.
+
+    manifest.json хранит для каждой партиции диапазон времени начала,
+    число записей и часы по категориям. Запросы открывают только
+    партиции, пересекающиеся с периодом. Закончившиеся месяцы
+    запечатываются (файл только для чтения); запечатанная партиция
+    открывается на запись только на время дозаписи опоздавших записей,
+    переименования и миграций. Запись идёт под блокировкой каталога
+    через журнал предзаписи.
+    """
+
+    def __init__(self, path=DEFAULT_PARTITION_DIR, today=None, seal=True):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.manifest_path = os.path.join(path, MANIFEST_NAME)
+        self.lock_path = os.path.join(path, ".lock")
+        self.journal_path = os.path.join(path, "journal.json")
+        # Фиксированная "сегодняшняя" дата нужна только для импорта и проверок
+        self.today = today
+        # seal=False - не запечатывать месяцы на время массового импорта истории
+        self.seal = seal
+        with file_lock(self.lock_path):
+            self.manifest = self._load_manifest()
+            self._replay_journal()
+            self._upgrade_manifest()
+            if self.seal:
+                self._seal_closed_months()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": MANIFEST_VERSION, "partitions": {}}
+
+    def _upgrade_manifest(self):
+        # В старом manifest часы активности целиком относились к месяцу начала
+        if self.manifest.get("version") == MANIFEST_VERSION:
+            return
+        for month, entry in self.manifest["partitions"].items():
+            with self._unsealed(month):
+                records = self._partition(month).read_all()
+            entry["totals"], entry["carry"] = month_split_totals(month, records)
+        self.manifest["version"] = MANIFEST_VERSION
+        self._save_manifest()
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=4, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def _partition_file(self, month):
+        return os.path.join(self.path, f"{month}.jsonl")
+
+    def _partition(self, month):
+        return JsonlStorage(self._partition_file(month), legacy_path=None)
+
+    @contextmanager
+    def _unsealed(self, month):
+        """Снимает с запечатанной партиции защиту от записи на время изменения."""
+        file_path = self._partition_file(month)
+        entry = self.manifest["partitions"].get(month)
+        sealed = entry is not None and entry["sealed"] and os.path.exists(file_path)
+        if sealed:
+            os.chmod(file_path, 0o644)
+        try:
+            yield
+        finally:
+            if sealed:
+                os.chmod(file_path, 0o444)
+
+    def seal_closed_months(self):
+        """Запечатывает месяцы, в которые уже не может прийти новая запись."""
+        with file_lock(self.lock_path):
+            self.manifest = self._load_manifest()
+            self._seal_closed_months()
+
+    def _seal_closed_months(self):
+        today = self.today or datetime.today().date()
+        # Активность, начатая в конце месяца, может завершиться уже в следующем
+        open_since = (today - MAX_ACTIVITY_SPAN).strftime("%Y-%m")
+        changed = False
+        for month, entry in self.manifest["partitions"].items():
+            if month != UNDATED_PARTITION and month < open_since and not entry["sealed"]:
+                entry["sealed"] = True
+                os.chmod(self._partition_file(month), 0o444)
+                changed = True
+        if changed:
+            self._save_manifest()
+
+    def append(self, record):
+        """Добавляет одну запись в партицию её месяца."""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Раскладывает записи по месяцам и обновляет manifest."""
+        records = list(records)
+        with file_lock(self.lock_path):
+            # Другой процесс мог дописать партиции с момента открытия
+            # или упасть посреди записи, оставив журнал
+            self.manifest = self._load_manifest()
+            self._replay_journal()
+            by_month = self._group_by_month(records)
+            for month in by_month:
+                # Открытие партиции отрезает оборванную строку до замера её размера
+                with self._unsealed(month):
+                    self._partition(month)
+            # Запись за уже запечатанный месяц (например, таймер, остановленный
+            # после полуночи 1-го числа) дописывается в свою партицию
+            sizes = {month: file_size(self._partition_file(month)) for month in by_month}
+            write_journal(self.journal_path, {"manifest": self.manifest, "sizes": sizes, "records": records})
+            self._apply(records)
+            os.remove(self.journal_path)
+            if self.seal:
+                self._seal_closed_months()
+
+    def _replay_journal(self):
+        entry = read_journal(self.journal_path)
+        if entry is None:
+            return
+        # Возвращаем партиции и manifest к состоянию до сбоя и повторяем запись
+        self.manifest = entry["manifest"]
+        for month, size in entry["sizes"].items():
+            with self._unsealed(month):
+                truncate_file(self._partition_file(month), size)
+        self._apply(entry["records"])
+        os.remove(self.journal_path)
+        print(f"Recovered {len(entry['records'])} activities from {self.journal_path}")
+
+    def _group_by_month(self, records):
+        by_month = {}
+        for record in records:
+            start = record.get("start")
+            month = start[:7] if isinstance(start, str) else UNDATED_PARTITION
+            by_month.setdefault(month, []).append(record)
+        return by_month
+
+    def _apply(self, records):
+        for month, month_records in self._group_by_month(records).items():
+            with self._unsealed(month):
+                self._partition(month)._append_lines(month_records)
+            entry = self.manifest["partitions"].setdefault(month, {
+                "first_start": None, "last_start": None, "count": 0, "totals": {}, "carry": {}, "sealed": False
+            })
+            starts = [record["start"] for record in month_records if isinstance(record.get("start"), str)]
+            if starts:
+                entry["first_start"] = min([start for start in (entry["first_start"], min(starts)) if start])
+                entry["last_start"] = max([start for start in (entry["last_start"], max(starts)) if start])
+            entry["count"] += len(month_records)
+            totals, carry = month_split_totals(month, month_records)
+            add_hours(entry["totals"], totals)
+            for later, hours in carry.items():
+                add_hours(entry["carry"].setdefault(later, {}), hours)
+        self._save_manifest()
+
+    def partitions_for(self, start_date, end_date):
+        """Месяцы, партиции которых пересекаются с [start_date, end_date]."""
+        low, high = start_date.strftime("%Y-%m"), end_date.strftime("%Y-%m")
+        self.manifest = self._load_manifest()
+        return sorted(
+            month for month in self.manifest["partitions"]
+            if month != UNDATED_PARTITION and low <= month <= high
+        )
+
+    def existing_keys(self, keys):
+        """Какие из ключей (name, start) уже есть; читаются только партиции их месяцев."""
+        keys = set(keys)
+        self.manifest = self._load_manifest()
+        found = set()
+        for month, month_keys in self._group_by_month([{"name": name, "start": start} for name, start in keys]).items():
+            if month in self.manifest["partitions"]:
+                found |= self._partition(month).existing_keys(activity_keys(month_keys))
+        return found
+
+    def month_totals(self, month):
+        """Часы по категориям за месяц ("YYYY-MM") прямо из manifest.
+
+        Как и daily_totals, часы активности, перешедшей через полночь
+        в следующий месяц, относятся к тому месяцу, в который попали.
+        """
+        partitions = self._load_manifest()["partitions"]
+        entry = partitions.get(month)
+        totals = dict(entry["totals"]) if entry else {}
+        for other in partitions.values():
+            add_hours(totals, other["carry"].get(month, {}))
+        return totals
+
+    def iter_all(self):
+        """Все записи по порядку месяцев, записи без даты - в конце."""
+        self.manifest = self._load_manifest()
+        months = sorted(month for month in self.manifest["partitions"] if month != UNDATED_PARTITION)
+        if UNDATED_PARTITION in self.manifest["partitions"]:
+            months.append(UNDATED_PARTITION)
+        for month in months:
+            yield from self._partition(month).iter_all()
+
+    def read_all(self):
+        """Чтение всех записей списком."""
+        return list(self.iter_all())
+
+    def iter_range(self, start_date, end_date, name=None):
+        """Потоковая выборка за период: читаются только нужные месяцы."""
+        for month in self.partitions_for(start_date, end_date):
+            yield from self._partition(month).iter_range(start_date, end_date, name)
+
+    def query_range(self, start_date, end_date, name=None):
+        """Активности, начавшиеся с start_date по end_date включительно."""
+        return list(self.iter_range(start_date, end_date, name))
+
+    def search(self, words, start_date, end_date, names=None, limit=None):
+        """Поиск по словам заметок: перебор только партиций нужных месяцев."""
+        return search_records(self.iter_range(start_date, end_date), words, names, limit)
+
+    def daily_totals(self, start_date, end_date):
+        """Часы по (день, категория) за период по соответствующим партициям."""
+        totals = sum_daily_totals(self.iter_range(start_date - MAX_ACTIVITY_SPAN, end_date))
+        low, high = start_date.isoformat(), end_date.isoformat()
+        return {key: hours for key, hours in totals.items() if low <= key[0] <= high}
+
+    def rename_categories(self, mapping):
+        """Переименовывает категории во всех партициях, включая запечатанные.
+
+        Меняются только имена: часы и диапазоны в manifest остаются прежними.
+        """
+        changed = 0
+        with file_lock(self.lock_path):
+            self.manifest = self._load_manifest()
+            for month, entry in self.manifest["partitions"].items():
+                with self._unsealed(month):
+                    changed += self._partition(month).rename_categories(mapping)
+                entry["totals"] = renamed_hours(entry["totals"], mapping)
+                entry["carry"] = {later: renamed_hours(hours, mapping) for later, hours in entry["carry"].items()}
+            self._save_manifest()
+        return changed
+
+    def rewrite_records(self, update):
+        """Переписывает записи всех партиций, включая запечатанные, через update(пачка) -> записи.
+
+        update не должен менять месяц начала записи. Часы и диапазоны
+        в manifest пересчитываются. Возвращает число изменённых записей.
+        """
+        changed = 0
+        with file_lock(self.lock_path):
+            self.manifest = self._load_manifest()
+            for month, entry in self.manifest["partitions"].items():
+                with self._unsealed(month):
+                    partition = self._partition(month)
+                    changed += partition.rewrite_records(update)
+                records = partition.read_all()
+                starts = [record["start"] for record in records if isinstance(record.get("start"), str)]
+                entry["first_start"] = min(starts) if starts else None
+                entry["last_start"] = max(starts) if starts else None
+                entry["totals"], entry["carry"] = month_split_totals(month, records)
+            self._save_manifest()
+        return changed
+
+    def clear(self):
+        """Удаляет все партиции, включая запечатанные."""
+        with file_lock(self.lock_path):
+            for month in self._load_manifest()["partitions"]:
+                file_path = self._partition_file(month)
+                if os.path.exists(file_path):
+                    os.chmod(file_path, 0o644)
+                    os.remove(file_path)
+            self.manifest = {"version": MANIFEST_VERSION, "partitions": {}}
+            self._save_manifest()
+
+    def close(self):
+        pass
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import pytest
+
+import categories
+from api_server import ApiServer, store_signature
+from categories import CategoryRegistry
+from storage import SqliteStorage, open_storage
+
+RECORD = {"name": "study", "start": "2024-11-20T10:00:00+01:00", "end": "2024-11-20T11:00:00+01:00",
+          "duration": "1:00:00", "note": ""}
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(categories, "_registry", CategoryRegistry(None))
+
+
+def test_signature_ignores_opening_and_closing_sqlite(tmp_path):
+    path = str(tmp_path / "report.db")
+    storage = SqliteStorage(path, log_path=None, legacy_path=None)
+    storage.append(RECORD)
+    storage.close()
+    signature = store_signature(path)
+
+    # Каждое открытие создаёт пустой -wal, закрытие его удаляет
+    reader = open_storage(path)
+    assert store_signature(path) == signature
+    reader.close()
+    assert store_signature(path) == signature
+
+
+def test_signature_of_legacy_json_follows_its_log(tmp_path):
+    path = str(tmp_path / "old.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"activities": []}, f)
+    storage = open_storage(path)
+    signature = store_signature(path)
+
+    storage.append(RECORD)
+    assert store_signature(path) != signature
+
+
+def test_repeated_aggregate_is_served_from_cache(tmp_path):
+    path = str(tmp_path / "report.db")
+    storage = SqliteStorage(path, log_path=None, legacy_path=None)
+    storage.append(RECORD)
+    storage.close()
+    server = ApiServer(path)
+    target = "/aggregate?start=2024-01-01&end=2024-12-31&bucket=month"
+
+    first = asyncio.run(server.respond("GET", target))
+    second = asyncio.run(server.respond("GET", target))
+    assert second == first and json.loads(first[1])["totals"]["study"][10] == 1
+    assert (server.cache.hits, server.cache.misses) == (1, 1)
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from archive import Archive, pack, unpack
+from storage import JsonlStorage
+
+
+def record(name, start, end, note=""):
+    duration = str(datetime.fromisoformat(end) - datetime.fromisoformat(start)) if end else None
+    return {"name": name, "start": start, "end": end, "duration": duration, "note": note}
+
+
+# Смещения вокруг перевода часов в Европе (27.10.2024) и запись из другого пояса
+RECORDS = [
+    record("study", "2024-10-26T22:00:00+02:00", "2024-10-26T23:30:00+02:00", "лекция"),
+    record("relax", "2024-10-27T01:30:00+02:00", "2024-10-27T02:30:00+01:00", "через переход"),
+    record("homework", "2024-10-27T10:00:00+01:00", "2024-10-27T11:15:00+01:00"),
+    record("other", "2024-10-27T09:00:00-04:00", "2024-10-27T10:00:00-04:00", "в поездке"),
+    record("study", "2024-10-28T08:00:00+05:30", None),
+]
+
+
+def test_round_trip_keeps_offsets(tmp_path):
+    archive_path = str(tmp_path / "history.tta")
+    assert pack(RECORDS, archive_path) == len(RECORDS)
+
+    archive = Archive(archive_path)
+    try:
+        restored = list(archive.iter_records())
+    finally:
+        archive.close()
+    assert sorted(restored, key=lambda r: r["start"]) == sorted(RECORDS, key=lambda r: r["start"])
+
+
+def test_unpack_into_store(tmp_path):
+    archive_path = str(tmp_path / "history.tta")
+    pack(RECORDS, archive_path)
+    assert unpack(archive_path, str(tmp_path / "restored.jsonl")) == len(RECORDS)
+
+    restored = JsonlStorage(str(tmp_path / "restored.jsonl"), legacy_path=None).read_all()
+    assert sorted(restored, key=lambda r: r["start"]) == sorted(RECORDS, key=lambda r: r["start"])
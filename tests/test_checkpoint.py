@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+from categories import CategoryRegistry
+from checkpoint import FILE_SIZE, HEADER, KEY_MAGIC, KEY_SLOT, MAX_TIMERS, TimerCheckpoint
+from activity import to_epoch_us
+
+LONG_KEY = "aанглийский_язык_продвинутый"
+
+START = datetime(2024, 11, 23, 10, 0, tzinfo=timezone(timedelta(hours=1)))
+
+
+def make_registry(tmp_path):
+    registry = CategoryRegistry(str(tmp_path / "categories.json"))
+    registry.add_category(LONG_KEY, {"ru": "Английский", "en": "English"})
+    return registry
+
+
+def test_long_non_ascii_key_round_trips(tmp_path):
+    assert len(LONG_KEY.encode('utf-8')) > 32
+    registry = make_registry(tmp_path)
+    checkpoint = TimerCheckpoint(str(tmp_path / "activities.timers"), registry)
+    slot = checkpoint.start(LONG_KEY, START, "глава 3")
+    checkpoint.close()
+
+    checkpoint = TimerCheckpoint(str(tmp_path / "activities.timers"), registry)
+    heartbeat, sessions = checkpoint.recover()
+    checkpoint.close()
+    assert heartbeat == START
+    assert sessions == [(slot, LONG_KEY, START, None, "глава 3")]
+
+
+def test_stop_and_release(tmp_path):
+    checkpoint = TimerCheckpoint(str(tmp_path / "activities.timers"), make_registry(tmp_path))
+    first = checkpoint.start("study", START, "")
+    second = checkpoint.start(LONG_KEY, START, "")
+    checkpoint.stop(first, START + timedelta(hours=1))
+    checkpoint.release(second)
+    _, sessions = checkpoint.recover()
+    checkpoint.close()
+    assert sessions == [(first, "study", START, START + timedelta(hours=1), "")]
+
+
+def test_upgrade_drops_truncated_key(tmp_path):
+    # Файл прежнего формата: ключ обрезан до 32 байт посреди кириллической буквы
+    registry = make_registry(tmp_path)
+    slots = [
+        KEY_SLOT.pack(LONG_KEY.encode('utf-8'), to_epoch_us(START), 0, b""),
+        KEY_SLOT.pack(b"study", to_epoch_us(START), 0, "заметка".encode('utf-8')),
+    ]
+    slots += [b"\0" * KEY_SLOT.size] * (MAX_TIMERS - len(slots))
+    path = tmp_path / "activities.timers"
+    path.write_bytes(HEADER.pack(KEY_MAGIC, to_epoch_us(START)) + b"".join(slots))
+
+    checkpoint = TimerCheckpoint(str(path), registry)
+    heartbeat, sessions = checkpoint.recover()
+    checkpoint.close()
+    assert path.stat().st_size == FILE_SIZE
+    assert heartbeat == START
+    assert sessions == [(1, "study", START, None, "заметка")]
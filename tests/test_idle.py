@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+from idle import IDLE_SAMPLE_INTERVAL, IDLE_THRESHOLD, FakeIdleSource, IdleDetector
+
+START = datetime(2024, 11, 23, 10, 0).astimezone()
+
+SAMPLE = timedelta(seconds=IDLE_SAMPLE_INTERVAL)
+
+
+class Clock:
+    """Подменённое время, которое двигают тесты."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Session:
+    """Таймер приложения с замером каждые IDLE_SAMPLE_INTERVAL секунд."""
+
+    def __init__(self):
+        self.clock = Clock(START)
+        self.source = FakeIdleSource(self.clock)
+        self.detector = IdleDetector(self.source, clock=self.clock)
+
+    def work(self, duration):
+        """Ввод между каждыми двумя замерами; возвращает момент последнего ввода."""
+        for _ in range(duration // SAMPLE):
+            self.clock.now += SAMPLE / 2
+            self.source.touch()
+            last_input = self.clock.now
+            self.clock.now += SAMPLE / 2
+            self.detector.tick()
+        return last_input
+
+    def away(self, duration):
+        for _ in range(duration // SAMPLE):
+            self.clock.now += SAMPLE
+            self.detector.tick()
+
+
+def test_long_gap_is_cut_out():
+    session = Session()
+    left = session.work(timedelta(minutes=10))
+    session.away(timedelta(minutes=20))
+    last_idle_sample = session.clock.now
+    session.work(timedelta(minutes=10))
+
+    assert session.detector.split(START, session.clock.now) == [
+        (START, left), (last_idle_sample, session.clock.now)
+    ]
+
+
+def test_short_gap_is_kept():
+    session = Session()
+    session.work(timedelta(minutes=10))
+    session.away(IDLE_THRESHOLD - 2 * SAMPLE)
+    session.work(timedelta(minutes=10))
+
+    assert session.detector.current_gaps() == []
+    assert session.detector.split(START, session.clock.now) == [(START, session.clock.now)]
+
+
+def test_session_ending_while_idle():
+    session = Session()
+    left = session.work(timedelta(minutes=10))
+    session.away(timedelta(minutes=30))
+
+    # Перерыв ещё идёт: сессия заканчивается на последнем вводе
+    assert session.detector.split(START, session.clock.now) == [(START, left)]
+
+
+def test_discard_before_forgets_old_gaps():
+    session = Session()
+    session.work(timedelta(minutes=10))
+    session.away(timedelta(minutes=20))
+    back = session.clock.now
+    session.work(timedelta(minutes=10))
+    session.away(timedelta(minutes=20))
+    session.work(timedelta(minutes=10))
+    assert len(session.detector.gaps) == 2
+
+    session.detector.discard_before(back)
+    assert len(session.detector.gaps) == 1
+    assert session.detector.gaps[0][0] > back
+    # Сессия, начатая после первого перерыва, режется только вторым
+    assert len(session.detector.split(back, session.clock.now)) == 2
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+import categories
+from categories import CategoryRegistry
+from import_export import export_file, import_file
+from storage import JsonlStorage, SqliteStorage
+
+# Запись старого приложения: местное время без смещения и русское имя категории
+LEGACY_RECORDS = [
+    {"name": "Дз", "start": "2024-11-23T10:00:00", "end": "2024-11-23T11:00:00", "duration": "1:00:00", "note": "a"},
+    {"name": "study", "start": "2024-11-24T09:30:00", "end": "2024-11-24T10:00:00", "duration": "0:30:00", "note": ""},
+]
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(categories, "_registry", CategoryRegistry(None))
+
+
+@pytest.fixture(params=["sqlite", "jsonl"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        storage = SqliteStorage(str(tmp_path / "activities.db"), log_path=None, legacy_path=None)
+    else:
+        storage = JsonlStorage(str(tmp_path / "store.jsonl"), legacy_path=None)
+    storage.append_many(LEGACY_RECORDS)
+    storage.close()
+    return storage.path
+
+
+def test_reimporting_legacy_json_adds_nothing(tmp_path, store):
+    legacy_path = tmp_path / "old.json"
+    legacy_path.write_text(json.dumps({"activities": LEGACY_RECORDS}, ensure_ascii=False), encoding='utf-8')
+    assert import_file(str(legacy_path), store) == (0, 2, 0)
+
+
+def test_reimporting_own_export_adds_nothing(tmp_path, store):
+    for name in ("history.jsonl", "history.csv", "history.ics"):
+        assert export_file(str(tmp_path / name), store) == 2
+        assert import_file(str(tmp_path / name), store) == (0, 2, 0)
+
+
+def test_new_records_are_imported_once(tmp_path, store):
+    path = tmp_path / "new.jsonl"
+    record = dict(LEGACY_RECORDS[0], start="2024-11-25T10:00:00", end="2024-11-25T11:00:00")
+    path.write_text(json.dumps(record, ensure_ascii=False) + "\n" + json.dumps(record) + "\n", encoding='utf-8')
+    assert import_file(str(path), store) == (1, 1, 0)
+    assert import_file(str(path), store) == (0, 2, 0)
@@ -0,0 +1,66 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from intervals import IntervalIndex
+
+ZONE = timezone(timedelta(hours=1))
+DAY = datetime(2024, 11, 20, tzinfo=ZONE)
+
+
+def at(minutes):
+    return DAY + timedelta(minutes=minutes)
+
+
+def random_intervals(count, seed):
+    rng = random.Random(seed)
+    intervals = []
+    for _ in range(count):
+        start = rng.randrange(24 * 60)
+        # Примерно каждый десятый таймер ещё идёт
+        end = None if rng.random() < 0.1 else start + rng.randrange(1, 180)
+        intervals.append((at(start), end and at(end), rng.choice("abcd")))
+    return intervals
+
+
+def test_overlapping_and_running_at_match_a_scan():
+    intervals = random_intervals(500, seed=1)
+    index = IntervalIndex()
+    for start, end, item in intervals:
+        index.add(start, end, item)
+
+    rng = random.Random(2)
+    for _ in range(200):
+        low = at(rng.randrange(-60, 25 * 60))
+        high = low + timedelta(minutes=rng.randrange(1, 120))
+        expected = [(start, end, item) for start, end, item in intervals
+                    if start < high and (end is None or end > low)]
+        found = index.overlapping(low, high)
+        assert [start for start, _, _ in found] == sorted(start for start, _, _ in found)
+        assert sorted(found, key=repr) == sorted(expected, key=repr)
+        assert len(index.running_at(low)) == sum(
+            1 for start, end, _ in intervals if start <= low and (end is None or end > low))
+
+
+def test_coverage_counts_overlaps_once():
+    index = IntervalIndex()
+    index.add(at(60), at(120), "study")
+    index.add(at(90), at(150), "other")
+    index.add(at(200), None, "relax")
+
+    assert index.coverage(at(0), at(24 * 60), now=at(230)) == timedelta(minutes=120)
+    assert index.coverage(at(100), at(110), now=at(230)) == timedelta(minutes=10)
+
+
+def test_close_remove_and_discard_before():
+    index = IntervalIndex()
+    old = index.add(at(-24 * 60), at(-23 * 60), "study")
+    running = index.add(at(-25 * 60), None, "other")
+    today = index.add(at(60), None, "relax")
+
+    index.close(today, at(90))
+    assert index.running_at(at(70)) == [(at(-25 * 60), None, "other"), (at(60), at(90), "relax")]
+
+    index.discard_before(DAY)
+    assert old not in index.nodes and len(index) == 2
+    index.remove(running)
+    assert index.overlapping(at(-48 * 60), at(48 * 60)) == [(at(60), at(90), "relax")]
@@ -0,0 +1,54 @@
+from datetime import date
+
+import pytest
+
+import storage
+from storage import SqliteStorage
+
+# Вставлены не по порядку: запись 2023 года добавлена последней (импорт старой истории)
+RECORDS = [
+    {"name": "study", "start": "2024-03-01T10:00:00+01:00", "end": "2024-03-01T11:00:00+01:00",
+     "duration": "1:00:00", "note": "lecture notes"},
+    {"name": "relax", "start": "2024-05-01T10:00:00+02:00", "end": "2024-05-01T11:00:00+02:00",
+     "duration": "1:00:00", "note": "gym"},
+    {"name": "study", "start": "2024-06-01T10:00:00+02:00", "end": "2024-06-01T11:00:00+02:00",
+     "duration": "1:00:00", "note": "Lecture 5"},
+    {"name": "Учеба", "start": "2023-01-15T10:00:00+01:00", "end": "2023-01-15T11:00:00+01:00",
+     "duration": "1:00:00", "note": "first lecture"},
+]
+
+
+# Сколько новых записей просматривается перебором: одна (дальше - индекс),
+# две (часть перебором, часть по индексу) или все
+SCAN_LIMITS = {"fts": 1, "mixed": 2, "scan": 1000}
+
+
+@pytest.fixture(params=list(SCAN_LIMITS))
+def store(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "SEARCH_SCAN_LIMIT", SCAN_LIMITS[request.param])
+    sqlite = SqliteStorage(str(tmp_path / "activities.db"), log_path=None, legacy_path=None)
+    if request.param != "scan" and not sqlite.has_fts:
+        pytest.skip("SQLite is built without FTS5")
+    sqlite.append_many(RECORDS)
+    yield sqlite
+    sqlite.close()
+
+
+def starts(found):
+    return [activity["start"][:10] for activity in found]
+
+
+def test_newest_first(store):
+    found = store.search(["lect"], date(2000, 1, 1), date(2030, 1, 1))
+    assert starts(found) == ["2024-06-01", "2024-03-01", "2023-01-15"]
+
+
+def test_limit_keeps_newest(store):
+    found = store.search(["lecture"], date(2000, 1, 1), date(2030, 1, 1), limit=2)
+    assert starts(found) == ["2024-06-01", "2024-03-01"]
+
+
+def test_filters(store):
+    assert starts(store.search(["lecture"], date(2023, 1, 1), date(2023, 12, 31))) == ["2023-01-15"]
+    assert starts(store.search(["lecture"], date(2000, 1, 1), date(2030, 1, 1), names=["Учеба"])) == ["2023-01-15"]
+    assert starts(store.search([], date(2024, 4, 1), date(2024, 12, 31))) == ["2024-06-01", "2024-05-01"]
@@ -0,0 +1,145 @@
+import os
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import categories
+from categories import CategoryRegistry, DEFAULT_CATEGORY_KEYS
+from monthly_stats import read_monthly_data
+from stats_engine import aggregate
+from storage import JsonlStorage, PartitionedStorage, SqliteStorage
+from weekly_stats import read_and_process_json
+from yearly_stats import read_yearly_data
+
+WEEK_START = date(2024, 11, 18)
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(categories, "_registry", CategoryRegistry(None))
+
+
+def generate_records(count, seed, cross_midnight):
+    """Записи за ноябрь 2024 (местное время без смещения, как в старом журнале)."""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        start = datetime(2024, 11, 1) + timedelta(minutes=rng.randrange(30 * 24 * 60))
+        end = start + timedelta(minutes=rng.randrange(1, 300))
+        if not cross_midnight and end.date() != start.date():
+            end = datetime.combine(start.date(), datetime.max.time()).replace(microsecond=0)
+        records.append({
+            "name": rng.choice(DEFAULT_CATEGORY_KEYS), "start": start.isoformat(),
+            "end": end.isoformat(), "duration": str(end - start), "note": ""
+        })
+    return records
+
+
+def old_weekly_loop(records, category_keys):
+    # Цикл из weekly_stats до векторизации: вся длительность - в день недели начала
+    time_data = {key: [0] * 7 for key in category_keys}
+    for activity in records:
+        start_time = datetime.fromisoformat(activity["start"])
+        end_time = datetime.fromisoformat(activity["end"])
+        if activity["name"] in category_keys and WEEK_START <= start_time.date() < WEEK_START + timedelta(days=7):
+            time_data[activity["name"]][start_time.weekday()] += (end_time - start_time).total_seconds() / 3600
+    return time_data
+
+
+def old_monthly_loop(records, category_keys):
+    # Цикл из monthly_stats до векторизации: вся длительность - в день месяца начала
+    time_data = {key: [0] * 31 for key in category_keys}
+    for activity in records:
+        start_time = datetime.fromisoformat(activity["start"])
+        end_time = datetime.fromisoformat(activity["end"])
+        if activity["name"] in category_keys:
+            time_data[activity["name"]][start_time.day - 1] += (end_time - start_time).total_seconds() / 3600
+    return time_data
+
+
+def hourly_loop(records, category_keys, low, high):
+    # Эталон по одной записи: часы разрезаются на каждой границе часа
+    hours = int((high - low).total_seconds() // 3600)
+    time_data = {key: [0] * hours for key in category_keys}
+    for activity in records:
+        start_time = max(datetime.fromisoformat(activity["start"]), low)
+        end_time = min(datetime.fromisoformat(activity["end"]), high)
+        while start_time < end_time:
+            hour_end = min(end_time, start_time.replace(minute=0, second=0) + timedelta(hours=1))
+            index = int((start_time - low).total_seconds() // 3600)
+            time_data[activity["name"]][index] += (hour_end - start_time).total_seconds() / 3600
+            start_time = hour_end
+    return time_data
+
+
+def make_store(kind, tmp_path, records):
+    if kind == "sqlite":
+        storage = SqliteStorage(str(tmp_path / "activities.db"), log_path=None, legacy_path=None)
+    elif kind == "partitioned":
+        storage = PartitionedStorage(str(tmp_path / "activities"))
+    else:
+        storage = JsonlStorage(str(tmp_path / "store.jsonl"), legacy_path=None)
+    storage.append_many(records)
+    storage.close()
+    return storage.path
+
+
+def assert_same(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key in expected:
+        assert actual[key] == pytest.approx(expected[key], abs=1e-9)
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "jsonl"])
+def test_weekly_and_monthly_match_old_loops(tmp_path, kind):
+    records = generate_records(2000, seed=1, cross_midnight=False)
+    path = make_store(kind, tmp_path, records)
+    keys = DEFAULT_CATEGORY_KEYS
+
+    assert_same(read_and_process_json(path, keys, WEEK_START), old_weekly_loop(records, keys))
+    assert_same(read_monthly_data(path, keys, date(2024, 11, 1), date(2024, 11, 30)), old_monthly_loop(records, keys))
+
+
+@pytest.mark.parametrize("bucket", ["day", "hour"])
+def test_aggregate_closes_the_store(tmp_path, bucket):
+    path = make_store("sqlite", tmp_path, generate_records(10, seed=3, cross_midnight=False))
+    aggregate(path, DEFAULT_CATEGORY_KEYS, date(2024, 11, 1), date(2024, 12, 1), bucket)
+    # Файл -wal живёт, пока открыто хоть одно соединение
+    assert not os.path.exists(path + "-wal")
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "jsonl"])
+def test_hourly_buckets_match_record_loop(tmp_path, kind):
+    records = generate_records(2000, seed=2, cross_midnight=True)
+    path = make_store(kind, tmp_path, records)
+    keys = DEFAULT_CATEGORY_KEYS
+    low, high = datetime(2024, 11, 10, 6), datetime(2024, 11, 13, 18)
+
+    edges, totals = aggregate(path, keys, low, high, "hour")
+    assert len(edges) == int((high - low).total_seconds() // 3600) + 1
+    actual = {key: totals[code].tolist() for code, key in enumerate(keys)}
+    assert_same(actual, hourly_loop(records, keys, low, high))
+
+
+# Активности через полночь последнего дня месяца и года
+MONTH_END_RECORDS = [
+    {"name": "study", "start": "2024-10-31T21:00:00+01:00", "end": "2024-11-01T03:30:00+01:00", "duration": "", "note": ""},
+    {"name": "relax", "start": "2024-11-30T23:00:00+01:00", "end": "2024-12-01T01:00:00+01:00", "duration": "", "note": ""},
+    {"name": "other", "start": "2024-12-31T20:00:00+01:00", "end": "2025-01-01T02:00:00+01:00", "duration": "", "note": ""},
+]
+
+
+def test_yearly_totals_do_not_depend_on_the_store(tmp_path):
+    records = generate_records(500, seed=4, cross_midnight=True) + MONTH_END_RECORDS
+    keys = DEFAULT_CATEGORY_KEYS
+    results = {}
+    for kind in ("sqlite", "jsonl", "partitioned"):
+        directory = tmp_path / kind
+        directory.mkdir()
+        results[kind] = read_yearly_data(make_store(kind, directory, records), keys, 2024)
+
+    assert results["partitioned"]["study"][9] == pytest.approx(3)
+    assert_same(results["partitioned"], results["sqlite"])
+    assert_same(results["jsonl"], results["sqlite"])
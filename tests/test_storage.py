@@ -0,0 +1,85 @@
+import json
+import os
+import stat
+from datetime import date
+
+from storage import JsonlStorage, PartitionedStorage, file_size, write_journal
+
+
+def record(name, start, end, note=""):
+    return {"name": name, "start": start, "end": end, "duration": "", "note": note}
+
+
+NOVEMBER_3 = record("other", "2026-11-03T10:00:00+01:00", "2026-11-03T11:00:00+01:00")
+OCTOBER_31 = record("study", "2026-10-31T22:00:00+01:00", "2026-10-31T23:00:00+01:00")
+NOVEMBER_2 = record("relax", "2026-11-02T10:00:00+01:00", "2026-11-02T11:00:00+01:00")
+
+
+def test_late_record_is_appended_to_a_sealed_month(tmp_path):
+    path = str(tmp_path / "activities")
+    PartitionedStorage(path, today=date(2026, 10, 31)).append(
+        record("study", "2026-10-01T10:00:00+02:00", "2026-10-01T11:00:00+02:00"))
+
+    storage = PartitionedStorage(path, today=date(2026, 11, 2))
+    assert storage.manifest["partitions"]["2026-10"]["sealed"]
+    storage.append_many([OCTOBER_31, NOVEMBER_2])
+
+    october = storage.manifest["partitions"]["2026-10"]
+    assert october["sealed"] and october["count"] == 2
+    assert october["last_start"] == OCTOBER_31["start"]
+    assert not os.stat(os.path.join(path, "2026-10.jsonl")).st_mode & stat.S_IWUSR
+    assert [activity["start"] for activity in storage.iter_range(date(2026, 10, 31), date(2026, 11, 2))] == \
+        [OCTOBER_31["start"], NOVEMBER_2["start"]]
+
+
+def test_old_manifest_is_split_at_month_end(tmp_path):
+    path = str(tmp_path / "activities")
+    storage = PartitionedStorage(path, today=date(2026, 10, 31))
+    storage.append(record("study", "2026-10-31T22:00:00+01:00", "2026-11-01T02:00:00+01:00"))
+
+    # manifest версии 1: все часы - в месяце начала
+    with open(storage.manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    del manifest["version"]
+    manifest["partitions"]["2026-10"]["totals"] = {"study": 4.0}
+    del manifest["partitions"]["2026-10"]["carry"]
+    with open(storage.manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    storage = PartitionedStorage(path, today=date(2026, 11, 2))
+    assert storage.month_totals("2026-10") == {"study": 2.0}
+    assert storage.month_totals("2026-11") == {"study": 2.0}
+
+
+def crash_midway(journal_path, entry, file_path, record):
+    # Другой процесс записал журнал и упал на середине строки
+    write_journal(journal_path, entry)
+    line = json.dumps(record, ensure_ascii=False)
+    with open(file_path, 'a', encoding='utf-8') as f:
+        f.write(line[:len(line) // 2])
+
+
+def test_open_log_replays_journal_left_by_crashed_writer(tmp_path):
+    storage = JsonlStorage(str(tmp_path / "store.jsonl"), legacy_path=None)
+    storage.append(OCTOBER_31)
+
+    crash_midway(storage.journal_path, {"size": file_size(storage.path), "records": [NOVEMBER_2]},
+                 storage.path, NOVEMBER_2)
+    storage.append(NOVEMBER_3)
+
+    assert storage.read_all() == [OCTOBER_31, NOVEMBER_2, NOVEMBER_3]
+    assert not os.path.exists(storage.journal_path)
+
+
+def test_open_partitions_replay_journal_left_by_crashed_writer(tmp_path):
+    storage = PartitionedStorage(str(tmp_path / "activities"), today=date(2026, 11, 3))
+    storage.append(NOVEMBER_2)
+
+    partition_path = os.path.join(storage.path, "2026-11.jsonl")
+    entry = {"manifest": storage.manifest, "sizes": {"2026-11": file_size(partition_path)}, "records": [NOVEMBER_3]}
+    crash_midway(storage.journal_path, entry, partition_path, NOVEMBER_3)
+    storage.append(OCTOBER_31)
+
+    assert storage.read_all() == [OCTOBER_31, NOVEMBER_2, NOVEMBER_3]
+    assert storage.manifest["partitions"]["2026-11"]["count"] == 2
+    assert not os.path.exists(storage.journal_path)
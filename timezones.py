@@ -0,0 +1,228 @@
+"""Смещения от UTC: таблица переходов DST и миграция записей без смещения.
+
+Записи хранят время ISO-строкой со смещением ("2024-11-23T10:00:00+01:00"),
+то есть момент в UTC вместе со смещением, действовавшим при записи.
+Местный день и день недели берутся из самой строки, а длительность - из
+разницы моментов, поэтому смена DST или часового пояса её не искажает.
+
+Старые записи без смещения переводятся один раз:
+    python timezones.py migrate --store activities.db
+    python timezones.py migrate --store activities.db --zone Europe/Prague
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from storage import DEFAULT_STORE_PATH, open_storage
+
+MICROSECONDS = 10 ** 6
+
+# Шаг поиска переходов: между двумя переходами заведомо больше суток
+PROBE_STEP = 24 * 3600
+
+
+def utc_offset_at(seconds, zone=None):
+    """Смещение от UTC в секундах в момент seconds (Unix-время); zone=None - системный пояс."""
+    if zone is None:
+        return time.localtime(seconds).tm_gmtoff
+    return int(datetime.fromtimestamp(seconds, zone).utcoffset().total_seconds())
+
+
+class OffsetTable:
+    """Переходы смещения пояса на отрезке времени в виде двух массивов.
+
+    transitions[i] - момент (микросекунды UTC), с которого действует
+    offsets[i] (микросекунды). Поиск смещения для массива моментов -
+    один np.searchsorted, без zoneinfo на каждую запись.
+    """
+
+    def __init__(self, transitions, offsets):
+        self.transitions = transitions
+        self.offsets = offsets
+
+    def offsets_at(self, utc_us):
+        """Смещения для моментов UTC (микросекунды)."""
+        return self.offsets[np.searchsorted(self.transitions, utc_us, side='right') - 1]
+
+    def local_offsets(self, local_us):
+        """Смещения для местного времени (микросекунды по местным часам).
+
+        Для часа, пропущенного при переводе часов вперёд, берётся смещение
+        до перехода, для повторяющегося при переводе назад - после.
+        """
+        return self.offsets_at(local_us - self.offsets_at(local_us))
+
+
+@lru_cache(maxsize=32)
+def offset_table(first_year, last_year, zone=None):
+    """Таблица переходов с 1 января first_year по 31 декабря last_year (кэшируется)."""
+    low = int((datetime(first_year, 1, 1, tzinfo=timezone.utc) - timedelta(days=1)).timestamp())
+    high = int((datetime(last_year + 1, 1, 1, tzinfo=timezone.utc) + timedelta(days=1)).timestamp())
+    previous = utc_offset_at(low, zone)
+    transitions, offsets = [np.iinfo(np.int64).min], [previous]
+    for moment in range(low + PROBE_STEP, high + PROBE_STEP, PROBE_STEP):
+        offset = utc_offset_at(moment, zone)
+        if offset == previous:
+            continue
+        # Переход где-то в последних сутках - ищем до секунды делением пополам
+        before, after = moment - PROBE_STEP, moment
+        while after - before > 1:
+            middle = (before + after) // 2
+            if utc_offset_at(middle, zone) == previous:
+                before = middle
+            else:
+                after = middle
+        transitions.append(after * MICROSECONDS)
+        offsets.append(offset)
+        previous = offset
+    return OffsetTable(np.array(transitions, dtype=np.int64), np.array(offsets, dtype=np.int64) * MICROSECONDS)
+
+
+def table_for(local_times, zone=None):
+    """Таблица, покрывающая годы массива datetime64 (NaT пропускаются)."""
+    years = local_times[~np.isnat(local_times)].astype('datetime64[Y]').astype(np.int64) + 1970
+    if len(years) == 0:
+        return offset_table(1970, 1970, zone)
+    return offset_table(int(years.min()), int(years.max()), zone)
+
+
+def split_offset(value):
+    """ISO-строка -> (время без смещения, смещение в секундах или None, если его нет)."""
+    if len(value) > 19 and value[-6] in "+-" and value[-3] == ":":
+        sign = -1 if value[-6] == "-" else 1
+        return value[:-6], sign * (int(value[-5:-3]) * 3600 + int(value[-2:]) * 60)
+    return value, None
+
+
+def format_offset(seconds):
+    """3600 -> "+01:00", как в datetime.isoformat()."""
+    sign = "-" if seconds < 0 else "+"
+    minutes = abs(seconds) // 60
+    return f"{sign}{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _walls_and_offsets(values, zone):
+    # ISO-строки -> местное время datetime64[us] и смещения (микросекунды);
+    # строкам без смещения оно подбирается по таблице переходов
+    walls, offsets = [], []
+    for value in values:
+        if isinstance(value, str):
+            wall, offset = split_offset(value)
+        else:
+            wall, offset = None, 0
+        walls.append(wall)
+        offsets.append(offset)
+    wall_array = np.array(walls, dtype='datetime64[us]')
+    missing = np.fromiter((offset is None for offset in offsets), dtype=bool, count=len(offsets))
+    offset_array = np.array([offset or 0 for offset in offsets], dtype=np.int64) * MICROSECONDS
+    if missing.any():
+        local_us = wall_array[missing].astype(np.int64)
+        offset_array[missing] = table_for(wall_array[missing], zone).local_offsets(local_us)
+    return wall_array, offset_array
+
+
+def local_times(starts, ends, zone=None):
+    """ISO-строки начала и конца -> (начало по местным часам, конец в той же шкале).
+
+    Конец сдвигается на разницу смещений начала и конца, так что
+    ends - starts - настоящая длительность и через переход DST, а
+    дни и дни недели считаются по местному времени начала. None -> NaT.
+    ValueError, если NumPy не разобрал какую-то строку.
+    """
+    start_walls, end_times, _, _ = local_times_with_offsets(starts, ends, zone)
+    return start_walls, end_times
+
+
+def local_times_with_offsets(starts, ends, zone=None):
+    """Как local_times, плюс смещения начала и конца в микросекундах.
+
+    Строкам без смещения оно подбирается по поясу zone, у None смещение 0.
+    """
+    start_walls, start_offsets = _walls_and_offsets(starts, zone)
+    end_walls, end_offsets = _walls_and_offsets(ends, zone)
+    end_times = end_walls + (start_offsets - end_offsets).astype('timedelta64[us]')
+    return start_walls, end_times, start_offsets, end_offsets
+
+
+def attach_offsets(values, zone=None):
+    """Дописывает смещение к ISO-строкам без него; остальные значения не меняются.
+
+    Смещение берётся то, что действовало в поясе zone в тот момент.
+    """
+    naive = [
+        i for i, value in enumerate(values)
+        if isinstance(value, str) and len(value) >= 16 and split_offset(value)[1] is None
+    ]
+    if not naive:
+        return list(values)
+    try:
+        walls = np.array([values[i] for i in naive], dtype='datetime64[us]')
+    except ValueError:
+        # Испорченные строки остаются как есть
+        naive = [i for i in naive if _parses(values[i])]
+        walls = np.array([values[i] for i in naive], dtype='datetime64[us]')
+    offsets = table_for(walls, zone).local_offsets(walls.astype(np.int64)) // MICROSECONDS
+    suffixes = {offset: format_offset(offset) for offset in set(offsets.tolist())}
+    result = list(values)
+    for i, offset in zip(naive, offsets.tolist()):
+        result[i] = values[i] + suffixes[offset]
+    return result
+
+
+def _parses(value):
+    try:
+        np.datetime64(value, 'us')
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def attach_record_offsets(records, zone=None):
+    """Пачка записей с дописанными смещениями; длительность пересчитывается по моментам."""
+    starts = attach_offsets([record.get("start") for record in records], zone)
+    ends = attach_offsets([record.get("end") for record in records], zone)
+    result = []
+    for record, start, end in zip(records, starts, ends):
+        if start != record.get("start") or end != record.get("end"):
+            record = dict(record, start=start, end=end)
+            try:
+                record["duration"] = str(datetime.fromisoformat(end) - datetime.fromisoformat(start))
+            except (TypeError, ValueError):
+                pass
+        result.append(record)
+    return result
+
+
+def migrate_store(path, zone=None):
+    """Одноразово дописывает смещения к записям без него. Возвращает число изменённых записей."""
+    storage = open_storage(path)
+    try:
+        return storage.rewrite_records(lambda batch: attach_record_offsets(batch, zone))
+    finally:
+        storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time zone tools for the activity store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser("migrate", help="add UTC offsets to records stored without one")
+    migrate_parser.add_argument("--store", default=DEFAULT_STORE_PATH)
+    migrate_parser.add_argument("--zone", help="IANA time zone of the old records (default: system zone)")
+    args = parser.parse_args()
+
+    try:
+        zone = ZoneInfo(args.zone) if args.zone else None
+    except (KeyError, ValueError) as e:
+        print(f"Error: unknown time zone {args.zone} ({e})")
+        return 1
+    print(f"Added offsets to {migrate_store(args.store, zone)} activities in {args.store}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
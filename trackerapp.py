@@ -1,233 +1,341 @@
 import sys
-import json
-from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QDesktopWidget, QInputDialog, QMenu
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QDesktopWidget, QInputDialog, QMenu, QLabel
+from PyQt5.QtCore import Qt, QTimer
 from datetime import datetime, timedelta
+from storage import open_storage
+from persistence import BackgroundWriter
+from instrumentation import enable as enable_metrics
+from intervals import IntervalIndex
+from categories import get_registry
+from activity import Activity, iter_activities, local_now
+from checkpoint import TimerCheckpoint, checkpoint_path, HEARTBEAT_INTERVAL, RESUME_WINDOW
+from idle import IdleDetector, default_source, IDLE_THRESHOLD, IDLE_SAMPLE_INTERVAL
+
+
+# Общий стиль окна: тёмный фон и кнопки, выбираемые по objectName
+APP_STYLESHEET = """
+    #mainWindow, #mainWindow * { background-color: #36454f; }
+    QPushButton#menuButton, QPushButton#stopButton, QPushButton#languageButton {
+        color: #FFFFFF;
+        font-size: 16px;
+        border: none;
+        border-radius: 8px;
+        padding: 10px;
+        margin: 5px;
+    }
+    QPushButton#menuButton { background-color: #436c70; }
+    QPushButton#menuButton:hover { background-color: #50898f; }
+    QPushButton#stopButton { background-color: #FF6B6B; }
+    QPushButton#stopButton:disabled { background-color: #CCCCCC; color: #888888; }
+    QPushButton#stopButton:hover:!disabled { background-color: #FF5252; }
+    QPushButton#languageButton { background-color: #4ECDC4; font-size: 14px; padding: 8px; }
+    QPushButton#languageButton:hover { background-color: #48C9B0; }
+    QLabel#statusLabel { color: #FFFFFF; font-size: 12px; }
+    #searchWindow QLabel, #searchWindow QListWidget { color: #FFFFFF; }
+"""
 
 
 class TimeTrackerApp(QMainWindow):
+    # Data menu: (translation id, method)
+    DATA_ACTIONS = [
+        ("Show Weekly Data", "show_week_data"),
+        ("Show Monthly Data", "show_month_data"),
+        ("Show Yearly Data", "show_year_data"),
+        ("Search Notes", "show_search"),
+    ]
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Time Tracker")
-        self.setFixedSize(300, 300)  # Компактный размер окна
+        self.setFixedSize(300, 330)  # Компактный размер окна
         self.center()
-        self.setStyleSheet("background-color: #36454f;")  # Темный фон
+        self.setObjectName("mainWindow")
+
+        # One stylesheet for the whole application, parsed by Qt only once
+        app = QApplication.instance()
+        if app.styleSheet() != APP_STYLESHEET:
+            app.setStyleSheet(APP_STYLESHEET)
 
-        # Storing activities and their times
+        # Storing activities and their times (several timers may run at once)
         self.activity_timers = {}
 
+        # SQLite activity store (migrates activities.jsonl/activities.json on first run)
+        self.storage = open_storage()
+
+        # Saving happens in a background thread so the window never waits for the disk
+        self.writer = BackgroundWriter(self.storage.path, self)
+        self.writer.saved.connect(self.on_saved)
+        self.writer.failed.connect(self.on_save_failed)
+        self.writer.start()
+
+        # Running and recent activities for overlap / "what was running at" queries
+        self.intervals = IntervalIndex()
+        self.load_recent_intervals()
+
+        # Running timers are checkpointed to a small fixed-size file so a crash loses nothing
+        self.checkpoint = TimerCheckpoint(checkpoint_path(self.storage.path))
+        self.unsaved_slots = []
+        self.heartbeat_timer = QTimer(self)
+        self.heartbeat_timer.setInterval(HEARTBEAT_INTERVAL * 1000)
+        self.heartbeat_timer.timeout.connect(self.checkpoint.heartbeat)
+
+        # Optional idle detection, see enable_idle_detection
+        self.idle = None
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setInterval(IDLE_SAMPLE_INTERVAL * 1000)
+
+        # Chart and search windows are created on first use
+        self.chart_window = None
+        self.search_window = None
+
         # Language support
         self.languages = {
             "ru": {
-                "study": "Учеба",
-                "homework": "Дз",
-                "relax": "Отдых",
-                "other": "Другое",
                 "Stop Activity": "Завершить",
                 "Enter Note": "Введите заметку",
                 "Note for Activity:": "Заметка:",
                 "No active activities to stop.": "Нет активных действий.",
                 "Data saved to activities.json": "Данные сохранены.",
                 "Error saving data:": "Ошибка сохранения:",
+                "Tracked today:": "Сегодня учтено:",
                 "Started activity:": "Начата активность:",
                 "Activity completed. Duration:": "Активность завершена. Длительность:",
                 "Note:": "Заметка:",
                 "was too short to save.": "была слишком короткой.",
                 "Show Weekly Data": "Неделя",
                 "Show Monthly Data": "Месяц",
+                "Show Yearly Data": "Год",
                 "Data": "Данные",
                 "Activity": "Активность",
+                "Already running:": "Уже идёт:",
+                "Cannot start activity:": "Не удалось начать:",
+                "Stop all": "Завершить все",
+                "Resumed activity:": "Продолжена активность:",
+                "Recovered activity:": "Восстановлена активность:",
+                "Idle time removed:": "Убран простой:",
+                "Idle detection is not available.": "Определение простоя недоступно.",
+                "Search Notes": "Поиск",
+                "Words from the note": "Слова из заметки",
+                "All categories": "Все категории",
+                "From": "С",
+                "To": "По",
+                "Search": "Найти",
+                "Found:": "Найдено:",
+                "Nothing found.": "Ничего не найдено.",
             },
             "en": {
-                "study": "Study",
-                "homework": "Homework",
-                "relax": "Relax",
-                "other": "Other",
                 "Stop Activity": "Stop",
                 "Enter Note": "Enter Note",
                 "Note for Activity:": "Note:",
                 "No active activities to stop.": "No active activities.",
                 "Data saved to activities.json": "Data saved.",
                 "Error saving data:": "Error saving:",
+                "Tracked today:": "Tracked today:",
                 "Started activity:": "Started activity:",
                 "Activity completed. Duration:": "Activity completed. Duration:",
                 "Note:": "Note:",
                 "was too short to save.": "was too short.",
                 "Show Weekly Data": "Week",
                 "Show Monthly Data": "Month",
+                "Show Yearly Data": "Year",
                 "Data": "Data",
                 "Activity": "Activity",
+                "Already running:": "Already running:",
+                "Cannot start activity:": "Cannot start activity:",
+                "Stop all": "Stop all",
+                "Resumed activity:": "Resumed activity:",
+                "Recovered activity:": "Recovered activity:",
+                "Idle time removed:": "Idle time removed:",
+                "Idle detection is not available.": "Idle detection is not available.",
+                "Search Notes": "Search",
+                "Words from the note": "Words from the note",
+                "All categories": "All categories",
+                "From": "From",
+                "To": "To",
+                "Search": "Search",
+                "Found:": "Found:",
+                "Nothing found.": "Nothing found.",
             }
         }
         self.current_language = "ru"
-        self.activity_keys = ["study", "homework", "relax", "other"]
+
+        # Categories (built-in and user-defined) and their labels come from the registry
+        registry = get_registry()
+        self.activity_keys = registry.keys()
+        for language, texts in self.languages.items():
+            texts.update({key: registry.label(key, language) for key in self.activity_keys})
 
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         self.layout = QVBoxLayout()
         central_widget.setLayout(self.layout)
 
-        self.buttons = {}
+        # Widgets and actions whose text is a translation id, retranslated in one pass
+        self.translatable = []
         self.create_activity_buttons()
 
         # Create the stop button
-        self.stop_button = QPushButton(self.tr("Stop Activity"))
-        self.stop_button.setStyleSheet("""
-            QPushButton {
-                background-color: #FF6B6B;
-                color: #FFFFFF;
-                font-size: 16px;
-                border: none;
-                border-radius: 8px;
-                padding: 10px;
-                margin: 5px;
-            }
-            QPushButton:disabled {
-                background-color: #CCCCCC;
-                color: #888888;
-            }
-            QPushButton:hover:!disabled {
-                background-color: #FF5252;
-            }
-        """)
-        self.stop_button.clicked.connect(self.stop_last_activity)
+        self.stop_button = self.add_button("Stop Activity", "stopButton", self.stop_last_activity)
         self.stop_button.setEnabled(False)  # Initially disabled
-        self.layout.addWidget(self.stop_button)
 
         # Create the language switch button
-        self.language_button = QPushButton("Switch Language")
-        self.language_button.setStyleSheet("""
-            QPushButton {
-                background-color: #4ECDC4;
-                color: #FFFFFF;
-                font-size: 14px;
-                border: none;
-                border-radius: 8px;
-                padding: 8px;
-                margin: 5px;
-            }
-            QPushButton:hover { background-color: #48C9B0; }
-        """)
+        self.language_button = self.add_button("Switch Language", "languageButton", self.switch_language)
         self.language_button.setFixedHeight(40)
         self.language_button.setMinimumWidth(150)
-        self.language_button.clicked.connect(self.switch_language)
-        self.layout.addWidget(self.language_button)
 
         # Create the "Данные" button with a dropdown menu
-        data_button = QPushButton(self.tr("Data"))
-        data_button.setStyleSheet("""
-            QPushButton {
-                background-color: #436c70;
-                color: #FFFFFF;
-                font-size: 16px;
-                border: none;
-                border-radius: 8px;
-                padding: 10px;
-                margin: 5px;
-            }
-            QPushButton:hover {
-                background-color: #50898f;
-            }
-        """)
-        self.layout.addWidget(data_button)
-
-        # Create the dropdown menu for the "Data" button
+        data_button = self.add_button("Data", "menuButton")
         data_menu = QMenu(self)
-        data_menu.addAction(self.tr("Show Weekly Data"), self.show_week_data)
-        data_menu.addAction(self.tr("Show Monthly Data"), self.show_month_data)
-
-        # Set the menu for the "Data" button
+        for text_id, slot in self.DATA_ACTIONS:
+            self.translated(data_menu.addAction(""), text_id).triggered.connect(getattr(self, slot))
         data_button.setMenu(data_menu)
 
+        # Save status line ("saved" / "error")
+        self.status_label = QLabel("")
+        self.status_label.setObjectName("statusLabel")
+        self.status_label.setAlignment(Qt.AlignCenter)
+        self.layout.addWidget(self.status_label)
+
+        self.recover_timers()
+
     def tr(self, text):
         """Перевод текста на текущий язык."""
         return self.languages[self.current_language].get(text, text)
 
-    def localize_categories(self):
-        """Возвращает локализованные названия категорий."""
-        return [self.tr(key) for key in self.activity_keys]
+    def translated(self, item, text_id):
+        """Задаёт текст виджета или действия по id перевода и запоминает его для смены языка."""
+        item.setText(self.tr(text_id))
+        self.translatable.append((item, text_id))
+        return item
+
+    def add_button(self, text_id, object_name, slot=None):
+        """Кнопка в столбце окна; вид задаётся общим стилем по object_name."""
+        button = self.translated(QPushButton(), text_id)
+        button.setObjectName(object_name)
+        if slot is not None:
+            button.clicked.connect(slot)
+        self.layout.addWidget(button)
+        return button
 
     def create_activity_buttons(self):
-        localized_labels = self.localize_categories()
-
-        # Create the "Активность" button with a dropdown menu
-        activity_button = QPushButton(self.tr("Activity"))
-        activity_button.setStyleSheet("""
-            QPushButton {
-                background-color: #436c70;
-                color: #FFFFFF;
-                font-size: 16px;
-                border: none;
-                border-radius: 8px;
-                padding: 10px;
-                margin: 5px;
-            }
-            QPushButton:hover {
-                background-color: #50898f;
-            }
-        """)
-        self.layout.addWidget(activity_button)
-
-        # Create the dropdown menu
+        # Create the "Активность" button with a dropdown menu of categories
+        activity_button = self.add_button("Activity", "menuButton")
         menu = QMenu(self)
-        for key, label in zip(self.activity_keys, localized_labels):
-            action = menu.addAction(label)
+        for key in self.activity_keys:
+            action = self.translated(menu.addAction(""), key)
             action.triggered.connect(lambda _, k=key: self.start_activity(k))
 
         # Show the menu when hovering over the button
         activity_button.setMenu(menu)
 
-    def style_button(self, button, color, hover_color):
-        button.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {color};
-                color: #FFFFFF;
-                font-size: 16px;
-                border: none;
-                border-radius: 8px;
-                padding: 10px;
-                margin: 5px;
-            }}
-            QPushButton:hover {{ background-color: {hover_color}; }}
-        """)
-        button.setCursor(Qt.PointingHandCursor)
-        button.setFixedHeight(40)
-        button.setMinimumWidth(150)
-
     def switch_language(self):
         self.current_language = "en" if self.current_language == "ru" else "ru"
         self.update_ui_language()
 
     def update_ui_language(self):
-        localized_labels = self.localize_categories()
-        for key, button in self.buttons.items():
-            button.setText(localized_labels[self.activity_keys.index(key)])
-        self.stop_button.setText(self.tr("Stop Activity"))
-        self.language_button.setText(self.tr("Switch Language"))
-
-        # Update "Data" button and menu actions
-        data_button = self.findChild(QPushButton, self.tr("Data"))
-        data_button.setText(self.tr("Data"))
-        for action in data_button.menu().actions():
-            action.setText(self.tr(action.text()))
+        for item, text_id in self.translatable:
+            item.setText(self.tr(text_id))
+
+    def load_recent_intervals(self):
+        """Заносит в индекс интервалов активности за сегодня и вчера."""
+        today = datetime.today().date()
+        for activity in iter_activities(self.storage.iter_range(today - timedelta(days=1), today)):
+            if activity.start is not None and activity.end is not None:
+                self.intervals.add(activity.start_time, activity.end_time, activity.name)
+
+    def tracked_today(self):
+        """Сколько времени сегодня шла хотя бы одна активность (параллельные не складываются)."""
+        now = local_now()
+        midnight = datetime.combine(now.date(), datetime.min.time()).astimezone()
+        return self.intervals.coverage(midnight, now, now)
+
+    def recover_timers(self):
+        """Продолжает или закрывает таймеры, оставшиеся от прошлого запуска."""
+        heartbeat, sessions = self.checkpoint.recover()
+        now = local_now()
+        for slot, key, start, end, note in sessions:
+            alive = heartbeat and now - heartbeat <= RESUME_WINDOW
+            if end is None and alive and key not in self.activity_timers:
+                # Перезапуск сразу после выхода: таймер просто идёт дальше
+                self.activity_timers[key] = {
+                    'start': start,
+                    'note': note,
+                    'interval': self.intervals.add(start, None, key),
+                    'slot': slot
+                }
+                print(f"{self.tr('Resumed activity:')} {self.tr(key)} {start.strftime('%H:%M:%S')}")
+                continue
+
+            # Сбой или сон: сессия заканчивается на последнем сердцебиении
+            end = end or max(heartbeat or start, start)
+            if end - start < timedelta(seconds=10) or self.is_saved(key, start):
+                self.checkpoint.release(slot)
+                continue
+            print(f"{self.tr('Recovered activity:')} {self.tr(key)} {start.strftime('%H:%M:%S')} - {end.strftime('%H:%M:%S')}")
+            self.intervals.add(start, end, key)
+            self.unsaved_slots.append(slot)
+            self.save_to_json(key, start, end, end - start, note)
 
-    def start_activity(self, activity_key):
         if self.activity_timers:
-            print(self.tr("There is already an active activity. Please stop it before starting a new one."))
+            self.stop_button.setEnabled(True)
+            self.set_timers_running(True)
+
+    def is_saved(self, activity_key, start_time):
+        """Есть ли уже запись с таким началом (сохранена, но слот не успели освободить)."""
+        start = start_time.isoformat()
+        day = start_time.date()
+        return any(activity["start"] == start for activity in self.storage.iter_range(day, day, activity_key))
+
+    def start_activity(self, activity_key):
+        if activity_key in self.activity_timers:
+            print(f"{self.tr('Already running:')} {self.tr(activity_key)}")
             return
 
         note, ok = QInputDialog.getText(self, self.tr("Enter Note"), self.tr("Note for Activity:"))
         if ok:
-            start_time = datetime.now()
+            start_time = local_now()
+            try:
+                # All checkpoint slots may be taken by running or not yet saved timers
+                slot = self.checkpoint.start(activity_key, start_time, note)
+            except ValueError as error:
+                self.status_label.setText(f"{self.tr('Cannot start activity:')} {error}")
+                return
             self.activity_timers[activity_key] = {
                 'start': start_time,
-                'note': note
+                'note': note,
+                'interval': self.intervals.add(start_time, None, activity_key),
+                'slot': slot
             }
+            self.set_timers_running(True)
             print(f"{self.tr('Started activity:')} {self.tr(activity_key)} {start_time.strftime('%H:%M:%S')} {self.tr('with note:')} {note}")
             self.stop_button.setEnabled(True)
 
+    def set_timers_running(self, running):
+        """Сердцебиение и замеры простоя идут, только пока идут таймеры."""
+        for timer in (self.heartbeat_timer, self.idle_timer):
+            if running:
+                timer.start()
+            else:
+                timer.stop()
+
+    def enable_idle_detection(self, threshold=IDLE_THRESHOLD, source=None):
+        """Включает вырезание простоя из сессий; source по умолчанию - X11 или /proc/interrupts."""
+        source = source or default_source()
+        if source is None:
+            print(self.tr("Idle detection is not available."))
+            return
+        self.idle = IdleDetector(source, threshold)
+        self.idle_timer.timeout.connect(self.idle.tick)
+
+    def active_segments(self, start_time, end_time):
+        """Части сессии без перерывов в вводе (вся сессия, если простой не отслеживается)."""
+        if self.idle is None:
+            return [(start_time, end_time)]
+        self.idle.tick()
+        return self.idle.split(start_time, end_time)
+
     def stop_activity(self, activity_key):
-        end_time = datetime.now()
+        end_time = local_now()
         activity_data = self.activity_timers.pop(activity_key, None)
 
         if activity_data:
@@ -235,83 +343,110 @@ class TimeTrackerApp(QMainWindow):
             note = activity_data['note']
             print(f"{self.tr('Activity completed. Duration:')} {duration}. {self.tr('Note:')} {note}")
 
-            if duration >= timedelta(seconds=10):
-                self.save_to_json(activity_key, activity_data['start'], end_time, duration, note)
+            segments = self.active_segments(activity_data['start'], end_time)
+            idle_time = duration - sum((end - start for start, end in segments), timedelta())
+            if idle_time:
+                print(f"{self.tr('Idle time removed:')} {idle_time}")
+            segments = [(start, end) for start, end in segments if end - start >= timedelta(seconds=10)]
+
+            if segments:
+                self.intervals.remove(activity_data['interval'])
+                self.checkpoint.stop(activity_data['slot'], end_time)
+                # The slot is released once the background writer confirms the last piece
+                self.unsaved_slots += [None] * (len(segments) - 1) + [activity_data['slot']]
+                for start, end in segments:
+                    self.intervals.add(start, end, activity_key)
+                    self.save_to_json(activity_key, start, end, end - start, note)
             else:
+                self.intervals.remove(activity_data['interval'])
+                self.checkpoint.release(activity_data['slot'])
                 print(f"{self.tr(activity_key)} {self.tr('was too short to save.')}")
         else:
             print(self.tr("No active activities to stop."))
 
         if not self.activity_timers:
             self.stop_button.setEnabled(False)
+            self.set_timers_running(False)
+        if self.idle is not None:
+            running = [data['start'] for data in self.activity_timers.values()]
+            self.idle.discard_before(min(running) if running else end_time)
+        # В индексе остаются только сегодняшние и вчерашние активности, как при запуске
+        yesterday = datetime.combine(end_time.date() - timedelta(days=1), datetime.min.time()).astimezone()
+        self.intervals.discard_before(yesterday)
 
     def stop_last_activity(self):
-        if self.activity_timers:
-            last_activity = next(iter(self.activity_timers))
-            self.stop_activity(last_activity)
-        else:
+        if not self.activity_timers:
             print(self.tr("No active activities to stop."))
+        elif len(self.activity_timers) == 1:
+            self.stop_activity(next(iter(self.activity_timers)))
+        else:
+            # Several timers are running: let the user pick which one to stop
+            menu = QMenu(self)
+            for key, data in self.activity_timers.items():
+                action = menu.addAction(f"{self.tr(key)}  {data['start'].strftime('%H:%M')}")
+                action.triggered.connect(lambda _, k=key: self.stop_activity(k))
+            menu.addSeparator()
+            menu.addAction(self.tr("Stop all"), self.stop_all_activities)
+            menu.exec_(self.stop_button.mapToGlobal(self.stop_button.rect().bottomLeft()))
+
+    def stop_all_activities(self):
+        for key in list(self.activity_timers):
+            self.stop_activity(key)
 
     def save_to_json(self, activity_key, start_time, end_time, duration, note):
-        try:
-            with open('activities.json', 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            data = {"activities": []}
-
-        data["activities"].append({
-            "name": activity_key,
-            "start": start_time.isoformat(),
-            "end": end_time.isoformat(),
-            "duration": str(duration),
-            "note": note
-        })
-
-        try:
-            with open('activities.json', 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-            print(self.tr("Data saved to activities.json"))
-        except Exception as e:
-            print(f"{self.tr('Error saving data:')} {e}")
-
-    def filter_activities_by_period(self, file_path, start_date, end_date):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            data = {"activities": []}
-
-        activities = data.get("activities", [])
-        filtered = []
-        for activity in activities:
-            if isinstance(activity["start"], str):
-                activity_start_date = datetime.fromisoformat(activity["start"]).date()
-                if start_date <= activity_start_date <= end_date:
-                    filtered.append(activity)
-        return filtered
-
-    def get_current_week_data(self):
-        today = datetime.today()
-        start_of_week = today - timedelta(days=today.weekday())
-        end_of_week = start_of_week + timedelta(days=6)
-        return self.filter_activities_by_period('activities.json', start_of_week.date(), end_of_week.date())
-
-    def get_current_month_data(self):
-        today = datetime.today()
-        start_of_month = today.replace(day=1)
-        next_month = start_of_month + timedelta(days=31)
-        end_of_month = next_month.replace(day=1) - timedelta(days=1)
-        return self.filter_activities_by_period('activities.json', start_of_month.date(), end_of_month.date())
+        activity = Activity.from_times(activity_key, start_time, end_time, note)
+
+        # The record is written by the background writer, see on_saved/on_save_failed
+        self.writer.submit(activity.to_record())
+
+    def on_saved(self, count):
+        # Records are saved in submission order
+        for slot in self.unsaved_slots[:count]:
+            if slot is not None:
+                self.checkpoint.release(slot)
+        del self.unsaved_slots[:count]
+        tracked = str(self.tracked_today()).split('.')[0]
+        self.status_label.setText(f"{self.tr('Data saved to activities.json')} {self.tr('Tracked today:')} {tracked}")
+
+    def on_save_failed(self, error):
+        self.status_label.setText(f"{self.tr('Error saving data:')} {error}")
+
+    def get_chart_window(self):
+        # matplotlib is slow to import, so it is loaded only when a chart is opened
+        if self.chart_window is None:
+            from chart_window import ChartWindow
+            self.chart_window = ChartWindow(self)
+        return self.chart_window
 
     def show_week_data(self):
-        week_data = self.get_current_week_data()
-        print("Weekly Data:")
-        print(json.dumps(week_data, ensure_ascii=False, indent=4))
+        import weekly_stats
+        time_data = weekly_stats.read_and_process_json(self.storage.path, self.activity_keys)
+        self.get_chart_window().show_chart(
+            self.tr("Show Weekly Data"), weekly_stats.draw_statistics, time_data, self.current_language
+        )
 
     def show_month_data(self):
-        month_data = self.get_current_month_data()
-        print("Monthly Data:")
-        print(json.dumps(month_data, ensure_ascii=False, indent=4))
+        import monthly_stats
+        today = datetime.today().date()
+        start_of_month = today.replace(day=1)
+        end_of_month = (start_of_month + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        time_data = monthly_stats.read_monthly_data(self.storage.path, self.activity_keys, start_of_month, end_of_month)
+        self.get_chart_window().show_chart(
+            self.tr("Show Monthly Data"), monthly_stats.draw_monthly_statistics, time_data, self.current_language
+        )
+
+    def show_year_data(self):
+        import yearly_stats
+        time_data = yearly_stats.read_yearly_data(self.storage.path, self.activity_keys, datetime.today().year)
+        self.get_chart_window().show_chart(
+            self.tr("Show Yearly Data"), yearly_stats.draw_yearly_statistics, time_data, self.current_language
+        )
+
+    def show_search(self):
+        if self.search_window is None:
+            from search_window import SearchWindow
+            self.search_window = SearchWindow(self)
+        self.search_window.show_search()
 
     def center(self):
         qt_rectangle = self.frameGeometry()
@@ -321,11 +456,33 @@ class TimeTrackerApp(QMainWindow):
 
 
 if __name__ == "__main__":
+    # --metrics or --metrics=cprofile|tracemalloc, same as TIMETRACKER_METRICS
+    for arg in sys.argv[1:]:
+        if arg == "--metrics" or arg.startswith("--metrics="):
+            enable_metrics(arg.partition("=")[2] or "metrics")
+
     app = QApplication(sys.argv)
     window = TimeTrackerApp()
+    # --idle or --idle=MINUTES: cut idle gaps out of sessions before saving
+    for arg in sys.argv[1:]:
+        if arg == "--idle" or arg.startswith("--idle="):
+            minutes = arg.partition("=")[2]
+            window.enable_idle_detection(timedelta(minutes=float(minutes)) if minutes else IDLE_THRESHOLD)
     window.show()
 
+    exit_code = 0
     try:
-        sys.exit(app.exec_())
+        exit_code = app.exec_()
     except KeyboardInterrupt:
         pass
+    finally:
+        # Flush everything still waiting in the save queue before exiting
+        if window.writer.close():
+            window.on_saved(len(window.unsaved_slots))
+        else:
+            print(window.tr("Error saving data:"), len(window.writer.pending))
+        # Timers still running stay in the checkpoint and are resumed on the next start
+        window.checkpoint.close()
+        if window.idle is not None:
+            window.idle.close()
+    sys.exit(exit_code)
@@ -0,0 +1,72 @@
+import matplotlib.pyplot as plt
+from datetime import date, datetime
+from storage import DEFAULT_STORE_PATH
+from columnar import to_time_data
+from stats_engine import aggregate
+from categories import get_registry
+
+# Перевод текста
+translations = {
+    "ru": {
+        "title": "Распределение времени по категориям за год",
+        "x_label": "Месяц",
+        "y_label": "Часы",
+        "months": ["Янв", "Фев", "Мар", "Апр", "Май", "Июн", "Июл", "Авг", "Сен", "Окт", "Ноя", "Дек"]
+    },
+    "en": {
+        "title": "Time Distribution by Categories (Yearly)",
+        "x_label": "Month",
+        "y_label": "Hours",
+        "months": ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    }
+}
+
+def read_yearly_data(file_path, category_keys, year):
+    """Часы по месяцам года с разрезанием активностей на границах месяцев."""
+    _, totals = aggregate(file_path, category_keys, date(year, 1, 1), date(year + 1, 1, 1), "month")
+    return to_time_data(totals, category_keys)
+
+def draw_yearly_statistics(fig, time_data, language="ru"):
+    """Рисует годовой график на уже созданной фигуре (старое содержимое стирается)."""
+    lang_data = translations[language]
+    months = lang_data["months"]
+
+    category_keys = list(time_data)
+
+    fig.clear()
+    ax = fig.add_subplot()
+
+    # Столбцы по месяцам, категории одна над другой
+    bottom_values = [0] * 12
+    for key in category_keys:
+        hours = time_data[key]
+        ax.bar(months, hours, bottom=bottom_values, label=get_registry().label(key, language))
+        bottom_values = [bottom_values[i] + hours[i] for i in range(12)]
+
+    ax.set_title(lang_data["title"])
+    ax.set_xlabel(lang_data["x_label"])
+    ax.set_ylabel(lang_data["y_label"])
+    ax.legend()
+    ax.grid(axis='y')
+
+def plot_yearly_statistics(time_data, language="ru", output_file=None):
+    """Построение графика за год."""
+    fig = plt.figure(figsize=(12, 6))
+    draw_yearly_statistics(fig, time_data, language)
+
+    # Сохранение графика в файл, если указан output_file
+    if output_file:
+        fig.savefig(output_file, dpi=300, bbox_inches='tight', transparent=True)
+        print(f"Graph saved to {output_file}")
+    else:
+        plt.show()
+
+if __name__ == "__main__":
+    category_keys = get_registry().keys()
+
+    time_data = read_yearly_data(DEFAULT_STORE_PATH, category_keys, datetime.today().year)
+
+    # Путь для сохранения графика
+    output_file = "doc/img/your_yearly_stats.jpg"
+
+    plot_yearly_statistics(time_data, language="ru", output_file=output_file)